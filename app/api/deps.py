@@ -1,21 +1,54 @@
 """
 API dependencies for authentication and database sessions.
 """
-from typing import Generator, Optional
-from datetime import datetime
+import hashlib
+import threading
+import uuid
+from typing import Any, Dict, Generator, Optional
+from datetime import datetime, timezone
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.core.security import verify_token, verify_api_key
-from app.models import User, APIKey
+from app.core.config import settings
+from app.core.database import get_db, acquire_async_conn
+from app.core.security import (
+    verify_token,
+    verify_api_key,
+    get_api_key_lookup_hash,
+)
+from app.models import User, UserRole, APIKey
 from app.schemas.user import TokenData
 
 security = HTTPBearer()
 
+USER_BY_ID_SQL = "SELECT id, email, name, role FROM users WHERE id = $1"
 
-def get_current_user(
-    db: Session = Depends(get_db),
+# Verified API keys, keyed by SHA-256 digest of the key -> (user_id, expires_at)
+_api_key_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=settings.auth_cache_size, ttl=settings.api_key_cache_ttl)
+    if settings.api_key_cache_ttl > 0 else None
+)
+_api_key_cache_lock = threading.Lock()
+
+
+async def load_user(user_id: str) -> Optional[User]:
+    """Load a detached user over the asyncpg pool, holding a connection only for the query."""
+    try:
+        user_uuid = uuid.UUID(str(user_id))
+    except ValueError:
+        return None
+    
+    async with acquire_async_conn() as conn:
+        row = await conn.fetchrow(USER_BY_ID_SQL, user_uuid)
+    
+    if row is None:
+        return None
+    # Enum columns come back as member names
+    return User(id=row["id"], email=row["email"], name=row["name"], role=UserRole[row["role"]])
+
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Security(security)
 ) -> User:
     """Get current authenticated user from JWT token."""
@@ -26,20 +59,33 @@ def get_current_user(
     )
     
     try:
-        payload = verify_token(credentials.credentials)
-        user_id: str = payload.get("sub")
+        user_id: str = verify_token(credentials.credentials).get("sub")
         if user_id is None:
             raise credentials_exception
         token_data = TokenData(user_id=user_id)
     except Exception:
         raise credentials_exception
     
-    user = db.query(User).filter(User.id == token_data.user_id).first()
+    user = await load_user(token_data.user_id)
     if user is None:
         raise credentials_exception
     return user
 
 
+def match_unhashed_api_key(db: Session, api_key: str, lookup_hash: str) -> Optional[APIKey]:
+    """Match a key stored before lookup hashes existed and backfill its lookup hash.
+    
+    Only rows without a lookup hash are checked, and a match takes the indexed
+    path from then on, so this scan shrinks as old keys are used.
+    """
+    for api_key_obj in db.query(APIKey).filter(APIKey.lookup_hash.is_(None)):
+        if verify_api_key(api_key, api_key_obj.key_hash):
+            api_key_obj.lookup_hash = lookup_hash
+            db.commit()
+            return api_key_obj
+    return None
+
+
 def get_current_user_from_api_key(
     db: Session = Depends(get_db),
     credentials: HTTPAuthorizationCredentials = Security(security)
@@ -55,43 +101,89 @@ def get_current_user_from_api_key(
     if not api_key.startswith("wf_"):
         raise credentials_exception
     
-    # Find API key in database
-    api_key_obj = db.query(APIKey).filter(APIKey.key_hash == api_key).first()
-    if not api_key_obj:
-        # Try to verify against hashed keys
-        api_keys = db.query(APIKey).all()
-        for key_obj in api_keys:
-            if verify_api_key(api_key, key_obj.key_hash):
-                api_key_obj = key_obj
-                break
+    cache_key = hashlib.sha256(api_key.encode()).digest()
+    cached = None
+    if _api_key_cache is not None:
+        with _api_key_cache_lock:
+            cached = _api_key_cache.get(cache_key)
     
-    if not api_key_obj:
-        raise credentials_exception
+    if cached is not None:
+        user_id, expires_at = cached
+    else:
+        # Find API key by its indexed lookup hash, then verify the secret
+        lookup_hash = get_api_key_lookup_hash(api_key)
+        api_key_obj = db.query(APIKey).filter(
+            APIKey.lookup_hash == lookup_hash
+        ).first()
+        
+        if api_key_obj is None:
+            # Verifies the secret itself while matching
+            api_key_obj = match_unhashed_api_key(db, api_key, lookup_hash)
+        elif not verify_api_key(api_key, api_key_obj.key_hash):
+            api_key_obj = None
+        
+        if api_key_obj is None:
+            raise credentials_exception
+        
+        user_id, expires_at = api_key_obj.user_id, api_key_obj.expires_at
+        if _api_key_cache is not None:
+            with _api_key_cache_lock:
+                _api_key_cache[cache_key] = (user_id, expires_at)
     
     # Check if API key is expired
-    if api_key_obj.expires_at and api_key_obj.expires_at < datetime.utcnow():
+    if expires_at and expires_at < datetime.now(timezone.utc):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="API key expired"
         )
     
-    user = db.query(User).filter(User.id == api_key_obj.user_id).first()
+    user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise credentials_exception
     
     return user
 
 
-def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user."""
     return current_user
 
 
-def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_token_claims(
+    credentials: HTTPAuthorizationCredentials = Security(security)
+) -> Dict[str, Any]:
+    """Get verified JWT claims without loading the user from the database."""
+    try:
+        claims = verify_token(credentials.credentials)
+    except Exception:
+        claims = {}
+    
+    if claims.get("sub") is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return claims
+
+
+async def get_admin_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current admin user."""
-    if current_user.role != "ADMIN":
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not enough permissions"
+        )
+    return current_user
+
+
+def get_admin_user_from_token(
+    claims: Dict[str, Any] = Depends(get_current_token_claims)
+) -> Dict[str, Any]:
+    """Admit admins on the role claim alone, skipping the user lookup."""
+    if claims.get("role") != UserRole.ADMIN.value:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not enough permissions"
         )
-    return current_user
\ No newline at end of file
+    return claims
\ No newline at end of file
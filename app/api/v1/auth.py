@@ -4,11 +4,12 @@ Authentication endpoints.
 from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 from app.core.database import get_db
-from app.core.security import verify_password, create_access_token, get_password_hash
+from app.core.security import verify_password_or_dummy, create_access_token, get_password_hash
 from app.core.config import settings
-from app.models import User
+from app.models import User, UserRole
 from app.schemas.user import UserCreate, UserResponse, Token
 
 router = APIRouter()
@@ -17,25 +18,30 @@ router = APIRouter()
 @router.post("/register", response_model=UserResponse)
 def register(user: UserCreate, db: Session = Depends(get_db)):
     """Register a new user."""
-    # Check if user already exists
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+    # Sync handler: FastAPI runs it in the threadpool, so the deliberately
+    # slow hash and the database calls stay off the event loop
+    hashed_password = get_password_hash(user.password)
+    
+    # Create new user; the unique email index rejects duplicates in the same statement
+    db_user = db.scalars(
+        pg_insert(User).values(
+            email=user.email,
+            name=user.name,
+            # Self-registered accounts never get elevated roles
+            role=UserRole.USER,
+            password_hash=hashed_password
+        ).on_conflict_do_nothing(
+            index_elements=["email"]
+        ).returning(User)
+    ).first()
+    
+    if db_user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    # Create new user
-    hashed_password = get_password_hash(user.password)
-    db_user = User(
-        email=user.email,
-        name=user.name,
-        role=user.role,
-        password_hash=hashed_password
-    )
-    db.add(db_user)
     db.commit()
-    db.refresh(db_user)
     
     return db_user
 
@@ -44,16 +50,21 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
 def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """Login and get access token."""
     user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    # Unknown users still pay for a hash check so timing doesn't reveal them
+    password_valid = verify_password_or_dummy(
+        form_data.password,
+        user.password_hash if user else None
+    )
+    if not user or not password_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": str(user.id)}, expires_delta=access_token_expires
+        data={"sub": str(user.id), "role": user.role.value}, expires_delta=access_token_expires
     )
     
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
@@ -1,14 +1,17 @@
 """
 Workflow execution endpoints.
 """
+import uuid
+from datetime import datetime
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi.responses import ORJSONResponse
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.deps import get_current_active_user
-from app.models import User, Workflow, Execution
+from app.models import User, Workflow, Execution, ExecutionStatus
 from app.services.workflow_service import WorkflowService
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 router = APIRouter()
 
@@ -30,8 +33,19 @@ class ExecutionResponse(BaseModel):
     started_at: Optional[str]
     completed_at: Optional[str]
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ExecutionSummaryResponse(BaseModel):
+    """Execution history entry without the input/output payloads."""
+    id: uuid.UUID
+    workflow_id: uuid.UUID
+    status: ExecutionStatus
+    created_at: datetime
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    
+    model_config = ConfigDict(from_attributes=True)
 
 
 @router.post("/{workflow_id}/execute", response_model=ExecutionResponse)
@@ -54,22 +68,20 @@ async def execute_workflow(
             detail="Workflow cannot be executed. Check if it's active."
         )
     
-    # Create execution record
+    # Pick the Celery task ID up front so the record is written in one commit
+    task_id = str(uuid.uuid4())
     execution = Execution(
+        id=uuid.uuid4(),
         workflow_id=workflow_id,
         input_data=execution_request.input_data,
-        status="PENDING"
+        execution_metadata={"celery_task_id": task_id},
+        status=ExecutionStatus.PENDING
     )
     db.add(execution)
     db.commit()
-    db.refresh(execution)
     
-    # Queue execution task with Celery
-    task = execute_workflow_task.delay(str(execution.id))
-    
-    # Store Celery task ID for tracking
-    execution.execution_metadata = {"celery_task_id": task.id}
-    db.commit()
+    # Queue execution task only once the record is visible to workers
+    execute_workflow_task.apply_async(args=[str(execution.id)], task_id=task_id)
     
     return execution
 
@@ -79,17 +91,39 @@ def get_workflow_executions(
     workflow_id: str,
     skip: int = 0,
     limit: int = 50,
+    summary: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
-    """Get workflow execution history."""
+    """Get workflow execution history.
+    
+    With summary=true the input/output payloads are neither loaded nor
+    returned, and each entry has the ExecutionSummaryResponse fields.
+    """
     workflow_service = WorkflowService(db)
     executions = workflow_service.get_workflow_executions(
-        workflow_id, str(current_user.id), limit, skip
+        workflow_id, str(current_user.id), limit, skip, summary_only=summary
     )
+    if summary:
+        # Serialized here so only the loaded columns are read from each row
+        return ORJSONResponse([
+            ExecutionSummaryResponse.model_validate(execution).model_dump()
+            for execution in executions
+        ])
     return executions
 
 
+@router.get("/{execution_id}/output")
+def get_execution_output(
+    execution_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Get the output of a workflow execution."""
+    workflow_service = WorkflowService(db)
+    return workflow_service.get_execution_output(execution_id, str(current_user.id))
+
+
 @router.get("/{workflow_id}/statistics")
 def get_workflow_statistics(
     workflow_id: str,
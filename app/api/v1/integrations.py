@@ -3,12 +3,14 @@ Integration management endpoints for n8n and other services.
 """
 from typing import List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.deps import get_current_active_user
 from app.models import User, Integration
 from app.services.n8n_service import N8nService
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
 router = APIRouter()
 
@@ -22,8 +24,7 @@ class IntegrationResponse(BaseModel):
     created_at: str
     updated_at: str
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class N8nSyncRequest(BaseModel):
@@ -31,14 +32,30 @@ class N8nSyncRequest(BaseModel):
     sync_direction: str = "from_n8n"  # "from_n8n" or "to_n8n"
 
 
-@router.get("/", response_model=List[IntegrationResponse])
+class N8nExportRequest(BaseModel):
+    """n8n bulk export request schema."""
+    workflow_ids: List[str]
+
+
+@router.get("/", response_model=List[IntegrationResponse], response_class=ORJSONResponse)
 def list_integrations(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """List all integrations."""
-    integrations = db.query(Integration).all()
-    return integrations
+    # Select only the response columns and serialize the rows directly,
+    # skipping ORM and Pydantic model construction for every row
+    rows = db.execute(
+        select(
+            Integration.id,
+            Integration.service_name,
+            Integration.service_url,
+            Integration.status,
+            Integration.created_at,
+            Integration.updated_at
+        )
+    ).mappings().all()
+    return ORJSONResponse([dict(row) for row in rows])
 
 
 @router.post("/n8n/connect", response_model=IntegrationResponse)
@@ -91,6 +108,23 @@ def sync_n8n_workflows(
         }
 
 
+@router.post("/n8n/export")
+async def export_workflows_to_n8n(
+    export_request: N8nExportRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Export several workflows to n8n concurrently."""
+    n8n_service = N8nService(db)
+    results = await n8n_service.export_many(export_request.workflow_ids, str(current_user.id))
+    
+    return {
+        "status": "success",
+        "results": results,
+        "count": sum(1 for result in results if result["status"] == "exported")
+    }
+
+
 @router.post("/n8n/export/{workflow_id}")
 def export_workflow_to_n8n(
     workflow_id: str,
@@ -1,84 +1,161 @@
 """
 Monitoring and health check endpoints.
 """
+import asyncio
 import logging
-from typing import Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+import threading
+from typing import Dict, Any, Callable, Optional
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from app.core.database import get_db
-from app.api.deps import get_current_active_user, get_admin_user
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.api.deps import get_current_active_user, get_admin_user_from_token
 from app.models import User
 from app.core.monitoring import monitor
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Most recent health check result, shared by liveness/load balancer probes
+_health_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=1, ttl=settings.health_cache_ttl)
+    if settings.health_cache_ttl > 0 else None
+)
+_health_cache_lock = threading.Lock()
+
+
+def _get_health_status() -> Dict[str, Any]:
+    """Return the health status, reusing a result computed within the cache TTL."""
+    if _health_cache is None:
+        return monitor.get_health_status()
+    
+    with _health_cache_lock:
+        health_status = _health_cache.get("health")
+        if health_status is None:
+            health_status = monitor.get_health_status()
+            _health_cache["health"] = health_status
+    return health_status
+
+
+# Recently collected metrics per kind, so concurrent scrapers share one collection
+_metrics_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=8, ttl=settings.metrics_cache_ttl)
+    if settings.metrics_cache_ttl > 0 else None
+)
+_metrics_cache_locks = {
+    kind: threading.Lock() for kind in ("system", "database", "celery", "application")
+}
+
+
+def _get_cached_metrics(kind: str, collect: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Return metrics of the given kind, collecting them at most once per cache TTL."""
+    if _metrics_cache is None:
+        return collect()
+    
+    # Per-kind lock: callers arriving during a refresh wait for its result
+    with _metrics_cache_locks[kind]:
+        metrics = _metrics_cache.get(kind)
+        if metrics is None:
+            metrics = collect()
+            # Failed collections are retried on the next call
+            if "error" not in metrics:
+                _metrics_cache[kind] = metrics
+    return metrics
+
+
+def _collect_with_session(collector: Callable[[Session], Dict[str, Any]]) -> Dict[str, Any]:
+    """Run a DB-backed collector on its own session so collectors can run concurrently."""
+    db = SessionLocal()
+    try:
+        return collector(db)
+    finally:
+        db.close()
+
 
 @router.get("/health")
-def health_check(db: Session = Depends(get_db)):
+def health_check(response: Response):
     """Public health check endpoint."""
-    health_status = monitor.get_health_status(db)
+    health_status = _get_health_status()
+    cache_control = f"max-age={max(settings.health_cache_ttl, 0)}"
     
     # Return appropriate HTTP status based on health
     if health_status["overall_status"] == "unhealthy":
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=health_status
+            detail=health_status,
+            headers={"Cache-Control": cache_control}
         )
     elif health_status["overall_status"] == "degraded":
         # Still return 200 but with degraded status
         pass
     
+    response.headers["Cache-Control"] = cache_control
     return health_status
 
 
 @router.get("/metrics/system")
 def get_system_metrics(
-    current_user: User = Depends(get_admin_user)
+    claims: Dict[str, Any] = Depends(get_admin_user_from_token)
 ):
     """Get system resource metrics (admin only)."""
-    return monitor.get_system_metrics()
+    return _get_cached_metrics("system", monitor.get_system_metrics)
 
 
 @router.get("/metrics/database")
 def get_database_metrics(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    claims: Dict[str, Any] = Depends(get_admin_user_from_token)
 ):
     """Get database metrics (admin only)."""
-    return monitor.get_database_metrics(db)
+    return _get_cached_metrics(
+        "database", lambda: _collect_with_session(monitor.get_database_metrics)
+    )
 
 
 @router.get("/metrics/celery")
 def get_celery_metrics(
-    current_user: User = Depends(get_admin_user)
+    claims: Dict[str, Any] = Depends(get_admin_user_from_token)
 ):
     """Get Celery task queue metrics (admin only)."""
-    return monitor.get_celery_metrics()
+    return _get_cached_metrics("celery", monitor.get_celery_metrics)
 
 
 @router.get("/metrics/application")
 def get_application_metrics(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+    claims: Dict[str, Any] = Depends(get_admin_user_from_token)
 ):
     """Get application-specific metrics (admin only)."""
-    return monitor.get_application_metrics(db)
+    return _get_cached_metrics(
+        "application", lambda: _collect_with_session(monitor.get_application_metrics)
+    )
 
 
 @router.get("/metrics/all")
-def get_all_metrics(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_admin_user)
+async def get_all_metrics(
+    claims: Dict[str, Any] = Depends(get_admin_user_from_token)
 ):
     """Get all metrics in one response (admin only)."""
     try:
+        # Collectors block on psutil, the database and Celery; overlap them
+        names = ["system", "database", "celery", "application", "health"]
+        results = await asyncio.gather(
+            run_in_threadpool(_get_cached_metrics, "system", monitor.get_system_metrics),
+            run_in_threadpool(
+                _get_cached_metrics, "database",
+                lambda: _collect_with_session(monitor.get_database_metrics)
+            ),
+            run_in_threadpool(_get_cached_metrics, "celery", monitor.get_celery_metrics),
+            run_in_threadpool(
+                _get_cached_metrics, "application",
+                lambda: _collect_with_session(monitor.get_application_metrics)
+            ),
+            run_in_threadpool(_get_health_status),
+            return_exceptions=True
+        )
         return {
-            "system": monitor.get_system_metrics(),
-            "database": monitor.get_database_metrics(db),
-            "celery": monitor.get_celery_metrics(),
-            "application": monitor.get_application_metrics(db),
-            "health": monitor.get_health_status(db)
+            name: {"error": str(result)} if isinstance(result, Exception) else result
+            for name, result in zip(names, results)
         }
     except Exception as e:
         logger.error(f"Error collecting all metrics: {e}")
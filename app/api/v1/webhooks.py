@@ -1,24 +1,36 @@
 """
 Webhook management endpoints for dynamic webhook handling.
 """
-import json
 import logging
+import orjson
 from typing import List, Dict, Any, Optional
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
-from fastapi.responses import JSONResponse
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, contains_eager
+from app.core.config import settings
+from app.core.database import get_db, acquire_async_conn
 from app.api.deps import get_current_active_user
 from app.models import User, Webhook, Workflow
-from app.tasks.workflow_tasks import process_webhook_task
+from app.celery_app import celery_app
 from app.websocket.events import events
-from pydantic import BaseModel
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
 import uuid
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Kept as one constant string so asyncpg's per-connection statement cache
+# reuses the server-side prepared statement on every dispatch
+WEBHOOK_DISPATCH_SQL = (
+    "SELECT id, workflow_id FROM webhooks "
+    "WHERE url_path = $1 AND method = $2 AND is_active"
+)
+
 
 class WebhookCreate(BaseModel):
     """Webhook creation schema."""
@@ -46,8 +58,33 @@ class WebhookResponse(BaseModel):
     is_active: bool
     created_at: str
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
+
+
+def user_owns_workflow(db: Session, workflow_id: str, current_user: User) -> bool:
+    """Check workflow ownership with an EXISTS probe instead of loading the row."""
+    return db.query(
+        exists().where(
+            Workflow.id == workflow_id,
+            Workflow.user_id == current_user.id
+        )
+    ).scalar()
+
+
+def get_owned_webhook(db: Session, webhook_id: str, current_user: User) -> Webhook:
+    """Load a webhook together with its workflow, scoped to the workflow owner."""
+    webhook = db.query(Webhook).join(Webhook.workflow).filter(
+        Webhook.id == webhook_id,
+        Workflow.user_id == current_user.id
+    ).options(contains_eager(Webhook.workflow)).first()
+    
+    if not webhook:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook not found"
+        )
+    
+    return webhook
 
 
 @router.get("/", response_model=List[WebhookResponse])
@@ -57,30 +94,21 @@ def list_webhooks(
     current_user: User = Depends(get_current_active_user)
 ):
     """List all webhooks, optionally filtered by workflow."""
-    query = db.query(Webhook)
-    
     if workflow_id:
         # Verify user has access to the workflow
-        workflow = db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.created_by == str(current_user.id)
-        ).first()
-        
-        if not workflow:
+        if not user_owns_workflow(db, workflow_id, current_user):
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Workflow not found"
             )
         
-        query = query.filter(Webhook.workflow_id == workflow_id)
+        webhooks = db.query(Webhook).filter(Webhook.workflow_id == workflow_id).all()
     else:
         # Only show webhooks for user's workflows
-        user_workflow_ids = db.query(Workflow.id).filter(
-            Workflow.created_by == str(current_user.id)
-        ).subquery()
-        query = query.filter(Webhook.workflow_id.in_(user_workflow_ids))
+        webhooks = db.query(Webhook).join(Webhook.workflow).filter(
+            Workflow.user_id == current_user.id
+        ).options(contains_eager(Webhook.workflow)).all()
     
-    webhooks = query.all()
     return webhooks
 
 
@@ -92,43 +120,33 @@ def create_webhook(
 ):
     """Create a new webhook."""
     # Verify user owns the workflow
-    workflow = db.query(Workflow).filter(
-        Workflow.id == webhook_data.workflow_id,
-        Workflow.created_by == str(current_user.id)
-    ).first()
-    
-    if not workflow:
+    if not user_owns_workflow(db, webhook_data.workflow_id, current_user):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Workflow not found"
         )
     
-    # Check if webhook path already exists
-    existing_webhook = db.query(Webhook).filter(
-        Webhook.url_path == webhook_data.url_path,
-        Webhook.method == webhook_data.method
+    # Create webhook; the (url_path, method) unique constraint rejects duplicates
+    webhook = db.scalars(
+        pg_insert(Webhook).values(
+            id=uuid.uuid4(),
+            workflow_id=webhook_data.workflow_id,
+            url_path=webhook_data.url_path,
+            method=webhook_data.method.upper(),
+            headers=webhook_data.headers or {},
+            is_active=True
+        ).on_conflict_do_nothing(
+            index_elements=["url_path", "method"]
+        ).returning(Webhook)
     ).first()
     
-    if existing_webhook:
+    if webhook is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Webhook with this path and method already exists"
         )
     
-    # Create webhook
-    webhook = Webhook(
-        id=str(uuid.uuid4()),
-        workflow_id=webhook_data.workflow_id,
-        url_path=webhook_data.url_path,
-        method=webhook_data.method.upper(),
-        headers=webhook_data.headers or {},
-        is_active=True,
-        created_at=datetime.utcnow()
-    )
-    
-    db.add(webhook)
     db.commit()
-    db.refresh(webhook)
     
     logger.info(f"Created webhook {webhook.id} for workflow {webhook_data.workflow_id}")
     return webhook
@@ -141,25 +159,7 @@ def get_webhook(
     current_user: User = Depends(get_current_active_user)
 ):
     """Get a specific webhook."""
-    webhook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
-    
-    if not webhook:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Webhook not found"
-        )
-    
-    # Verify user owns the workflow
-    workflow = db.query(Workflow).filter(
-        Workflow.id == webhook.workflow_id,
-        Workflow.created_by == str(current_user.id)
-    ).first()
-    
-    if not workflow:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    webhook = get_owned_webhook(db, webhook_id, current_user)
     
     return webhook
 
@@ -172,25 +172,7 @@ def update_webhook(
     current_user: User = Depends(get_current_active_user)
 ):
     """Update a webhook."""
-    webhook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
-    
-    if not webhook:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Webhook not found"
-        )
-    
-    # Verify user owns the workflow
-    workflow = db.query(Workflow).filter(
-        Workflow.id == webhook.workflow_id,
-        Workflow.created_by == str(current_user.id)
-    ).first()
-    
-    if not workflow:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    webhook = get_owned_webhook(db, webhook_id, current_user)
     
     # Update webhook fields
     if webhook_data.url_path is not None:
@@ -216,25 +198,7 @@ def delete_webhook(
     current_user: User = Depends(get_current_active_user)
 ):
     """Delete a webhook."""
-    webhook = db.query(Webhook).filter(Webhook.id == webhook_id).first()
-    
-    if not webhook:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Webhook not found"
-        )
-    
-    # Verify user owns the workflow
-    workflow = db.query(Workflow).filter(
-        Workflow.id == webhook.workflow_id,
-        Workflow.created_by == str(current_user.id)
-    ).first()
-    
-    if not workflow:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Access denied"
-        )
+    webhook = get_owned_webhook(db, webhook_id, current_user)
     
     db.delete(webhook)
     db.commit()
@@ -243,29 +207,60 @@ def delete_webhook(
     return {"message": "Webhook deleted successfully"}
 
 
+def _payload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Webhook body exceeds {settings.webhook_max_bytes} bytes"
+    )
+
+
+async def read_limited_body(request: Request, max_bytes: int) -> bytes:
+    """Read the request body, aborting as soon as it grows past max_bytes."""
+    chunks = []
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > max_bytes:
+            raise _payload_too_large()
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
 # Dynamic webhook handler
 @router.api_route("/trigger/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
 async def handle_webhook(
     path: str,
-    request: Request,
-    db: Session = Depends(get_db)
+    request: Request
 ):
     """Handle incoming webhook requests dynamically."""
     method = request.method
     
-    # Find matching webhook
-    webhook = db.query(Webhook).filter(
-        Webhook.url_path == path,
-        Webhook.method == method,
-        Webhook.is_active == True
-    ).first()
+    # Reject oversized payloads before touching the database
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.webhook_max_bytes:
+        raise _payload_too_large()
     
-    if not webhook:
+    # Find matching webhook; served by the ix_webhook_dispatch partial index.
+    # The pooled connection is held only for the lookup, not the upload
+    async with acquire_async_conn() as conn:
+        row = await conn.fetchrow(WEBHOOK_DISPATCH_SQL, path, method)
+    
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Webhook endpoint not found"
         )
     
+    webhook_id = str(row["id"])
+    workflow_id = str(row["workflow_id"])
+    
+    received_at = datetime.now(timezone.utc).isoformat()
+    
+    # Chunked uploads carry no Content-Length, so cap the body while streaming it
+    body_bytes = b""
+    if method in ["POST", "PUT", "PATCH"]:
+        body_bytes = await read_limited_body(request, settings.webhook_max_bytes)
+    
     try:
         # Get request data
         headers = dict(request.headers)
@@ -278,54 +273,62 @@ async def handle_webhook(
         if method in ["POST", "PUT", "PATCH"]:
             if "application/json" in content_type:
                 try:
-                    body = await request.json()
+                    body = orjson.loads(body_bytes)
                 except:
                     body = {}
             elif "application/x-www-form-urlencoded" in content_type:
-                form_data = await request.form()
-                body = dict(form_data)
+                body = dict(parse_qsl(body_bytes.decode("utf-8")))
             else:
-                body_bytes = await request.body()
                 body = body_bytes.decode("utf-8") if body_bytes else ""
         
         # Prepare webhook payload
         webhook_payload = {
-            "webhook_id": webhook.id,
-            "workflow_id": webhook.workflow_id,
+            "webhook_id": webhook_id,
+            "workflow_id": workflow_id,
             "method": method,
             "url_path": path,
             "headers": headers,
             "query_params": query_params,
             "body": body,
-            "timestamp": datetime.utcnow().isoformat()
+            "timestamp": received_at
         }
         
-        # Queue webhook processing task
-        task = process_webhook_task.delay(webhook_payload)
+        # Queue webhook processing by name, as a transient fire-and-forget message;
+        # the broker publish blocks, so it runs off the event loop
+        task = await run_in_threadpool(
+            celery_app.send_task,
+            "app.tasks.workflow_tasks.process_webhook_task",
+            args=[webhook_id, webhook_payload],
+            queue="webhooks_transient",
+            delivery_mode=1,
+            expires=300
+        )
         
         # Broadcast webhook received event
         await events.webhook_received({
-            "id": webhook.id,
-            "workflow_id": webhook.workflow_id,
+            "id": webhook_id,
+            "workflow_id": workflow_id,
             "method": method,
             "url_path": path,
-            "payload": webhook_payload
+            # Measured at ingestion rather than by re-serializing the payload
+            "payload_size": len(body_bytes),
+            "timestamp": received_at
         })
         
-        logger.info(f"Webhook {webhook.id} triggered for workflow {webhook.workflow_id}")
+        logger.info(f"Webhook {webhook_id} triggered for workflow {workflow_id}")
         
-        return JSONResponse(
+        return ORJSONResponse(
             status_code=200,
             content={
                 "status": "success",
                 "message": "Webhook received and queued for processing",
-                "webhook_id": webhook.id,
+                "webhook_id": webhook_id,
                 "task_id": task.id
             }
         )
         
     except Exception as e:
-        logger.error(f"Error processing webhook {webhook.id}: {e}")
+        logger.error(f"Error processing webhook {webhook_id}: {e}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process webhook"
@@ -1,15 +1,17 @@
 """
 WebSocket endpoints for real-time communication.
 """
-import json
+import asyncio
 import logging
-from typing import Dict, Any
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
+import uuid
+import orjson
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+from cachetools import TTLCache
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, status
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from app.core.database import get_db
+from app.core.config import settings
 from app.core.security import decode_access_token
-from app.models import User
+from app.api.deps import load_user
 from app.websocket.connection_manager import manager
 from app.websocket.events import events
 
@@ -18,7 +20,21 @@ security = HTTPBearer()
 logger = logging.getLogger(__name__)
 
 
-async def get_user_from_token(token: str, db: Session) -> User:
+class UserSnapshot(NamedTuple):
+    """Detached view of the user fields WebSocket handlers need."""
+    id: str
+    email: str
+    role: str
+
+
+# Recently authenticated WebSocket users, keyed by user ID
+_user_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=10000, ttl=settings.ws_user_cache_ttl)
+    if settings.ws_user_cache_ttl > 0 else None
+)
+
+
+async def get_user_from_token(token: str) -> UserSnapshot:
     """Get user from JWT token for WebSocket authentication."""
     try:
         payload = decode_access_token(token)
@@ -35,14 +51,22 @@ async def get_user_from_token(token: str, db: Session) -> User:
                 detail="Invalid token payload"
             )
         
-        user = db.query(User).filter(User.id == user_id).first()
+        if _user_cache is not None:
+            cached = _user_cache.get(user_id)
+            if cached is not None:
+                return cached
+        
+        user = await load_user(user_id)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found"
             )
         
-        return user
+        snapshot = UserSnapshot(id=str(user.id), email=user.email, role=user.role.value)
+        if _user_cache is not None:
+            _user_cache[user_id] = snapshot
+        return snapshot
     except Exception as e:
         logger.error(f"WebSocket authentication error: {e}")
         raise HTTPException(
@@ -51,11 +75,43 @@ async def get_user_from_token(token: str, db: Session) -> User:
         )
 
 
+async def receive_message(websocket: WebSocket) -> Dict[str, Any]:
+    """Receive one text or binary frame and parse it as JSON."""
+    frame = await websocket.receive()
+    if frame["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(frame.get("code", 1000))
+    
+    # orjson parses bytes directly, so binary frames skip the UTF-8 decode
+    data = frame.get("bytes") or frame.get("text")
+    return orjson.loads(data)
+
+
+async def read_into_inbox(websocket: WebSocket, inbox: asyncio.Queue) -> None:
+    """Read messages into a bounded inbox so a slow handler can't buffer without limit.
+    
+    The last item put is always the exception that ended the read loop.
+    """
+    try:
+        while True:
+            message = await receive_message(websocket)
+            if inbox.full():
+                if not settings.ws_inbox_drop_oldest:
+                    logger.warning("WebSocket inbox full, disconnecting client")
+                    await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+                    raise WebSocketDisconnect(status.WS_1008_POLICY_VIOLATION)
+                inbox.get_nowait()
+            inbox.put_nowait(message)
+    except Exception as e:
+        # Make room for the terminal item; the connection is ending anyway
+        if inbox.full():
+            inbox.get_nowait()
+        inbox.put_nowait(e)
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(
     websocket: WebSocket,
-    token: str = None,
-    db: Session = Depends(get_db)
+    token: str = None
 ):
     """Main WebSocket endpoint for real-time communication."""
     if not token:
@@ -64,98 +120,165 @@ async def websocket_endpoint(
     
     try:
         # Authenticate user
-        user = await get_user_from_token(token, db)
+        user = await get_user_from_token(token)
         user_id = str(user.id)
         
         # Connect user
         await manager.connect(websocket, user_id)
         
+        # Reading runs ahead of handling, bounded by the inbox size
+        inbox: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_inbox_size)
+        reader = asyncio.create_task(read_into_inbox(websocket, inbox))
+        
         try:
             while True:
                 # Receive message from client
-                data = await websocket.receive_text()
-                message = json.loads(data)
+                message = await inbox.get()
+                if isinstance(message, Exception):
+                    raise message
                 
                 # Handle different message types
                 await handle_websocket_message(message, user_id, websocket)
                 
         except WebSocketDisconnect:
-            manager.disconnect(websocket, user_id)
             logger.info(f"User {user_id} disconnected")
+        finally:
+            # Any error ending the loop must also stop the writer and drop
+            # the connection's queue, index and subscription entries
+            reader.cancel()
+            manager.disconnect(websocket, user_id)
             
     except Exception as e:
         logger.error(f"WebSocket connection error: {e}")
         await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
 
 
+# Pre-encoded subscription replies; ids are only substituted once they are
+# known to be canonical UUIDs, which never need JSON escaping
+SUBSCRIBED_WORKFLOW_REPLY = (
+    b'{"type":"subscription_confirmed","subscription_type":"workflow",'
+    b'"workflow_id":"%s","message":"Subscribed to workflow %s"}'
+)
+UNSUBSCRIBED_WORKFLOW_REPLY = (
+    b'{"type":"subscription_cancelled","subscription_type":"workflow",'
+    b'"workflow_id":"%s","message":"Unsubscribed from workflow %s"}'
+)
+SUBSCRIBED_EXECUTION_REPLY = (
+    b'{"type":"subscription_confirmed","subscription_type":"execution",'
+    b'"execution_id":"%s","message":"Subscribed to execution %s"}'
+)
+UNSUBSCRIBED_EXECUTION_REPLY = (
+    b'{"type":"subscription_cancelled","subscription_type":"execution",'
+    b'"execution_id":"%s","message":"Unsubscribed from execution %s"}'
+)
+
+
+def _is_canonical_uuid(value: Any) -> bool:
+    try:
+        return str(uuid.UUID(value)) == value
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+
+async def _send_subscription_reply(
+    websocket: WebSocket,
+    template: bytes,
+    reply_type: str,
+    subscription_type: str,
+    target_id: str
+):
+    """Send a subscription reply, using the pre-encoded template for UUID ids."""
+    if _is_canonical_uuid(target_id):
+        encoded_id = target_id.encode()
+        await manager.send_encoded_message(template % (encoded_id, encoded_id), websocket)
+        return
+    
+    # Arbitrary client-supplied ids go through orjson for proper escaping
+    verb = "Subscribed to" if reply_type == "subscription_confirmed" else "Unsubscribed from"
+    await manager.send_personal_message({
+        "type": reply_type,
+        "subscription_type": subscription_type,
+        f"{subscription_type}_id": target_id,
+        "message": f"{verb} {subscription_type} {target_id}"
+    }, websocket)
+
+
+async def _subscribe_workflow(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    workflow_id = message.get("workflow_id")
+    if workflow_id:
+        manager.subscribe_to_workflow(user_id, workflow_id)
+        await _send_subscription_reply(
+            websocket, SUBSCRIBED_WORKFLOW_REPLY, "subscription_confirmed", "workflow", workflow_id
+        )
+
+
+async def _unsubscribe_workflow(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    workflow_id = message.get("workflow_id")
+    if workflow_id:
+        manager.unsubscribe_from_workflow(user_id, workflow_id)
+        await _send_subscription_reply(
+            websocket, UNSUBSCRIBED_WORKFLOW_REPLY, "subscription_cancelled", "workflow", workflow_id
+        )
+
+
+async def _subscribe_execution(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    execution_id = message.get("execution_id")
+    if execution_id:
+        manager.subscribe_to_execution(user_id, execution_id)
+        await _send_subscription_reply(
+            websocket, SUBSCRIBED_EXECUTION_REPLY, "subscription_confirmed", "execution", execution_id
+        )
+
+
+async def _unsubscribe_execution(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    execution_id = message.get("execution_id")
+    if execution_id:
+        manager.unsubscribe_from_execution(user_id, execution_id)
+        await _send_subscription_reply(
+            websocket, UNSUBSCRIBED_EXECUTION_REPLY, "subscription_cancelled", "execution", execution_id
+        )
+
+
+async def _ping(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    await manager.send_personal_message({
+        "type": "pong",
+        "timestamp": message.get("timestamp")
+    }, websocket)
+
+
+async def _get_stats(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    await manager.send_personal_message({
+        "type": "stats",
+        "data": manager.get_connection_stats()
+    }, websocket)
+
+
+async def _unknown_message(message: Dict[str, Any], user_id: str, websocket: WebSocket):
+    await manager.send_personal_message({
+        "type": "error",
+        "message": f"Unknown message type: {message.get('type')}"
+    }, websocket)
+
+
+MessageHandler = Callable[[Dict[str, Any], str, WebSocket], Awaitable[None]]
+
+# Incoming message type -> handler
+MESSAGE_HANDLERS: Dict[str, MessageHandler] = {
+    "subscribe_workflow": _subscribe_workflow,
+    "unsubscribe_workflow": _unsubscribe_workflow,
+    "subscribe_execution": _subscribe_execution,
+    "unsubscribe_execution": _unsubscribe_execution,
+    "ping": _ping,
+    "get_stats": _get_stats,
+}
+
+
 async def handle_websocket_message(message: Dict[str, Any], user_id: str, websocket: WebSocket):
     """Handle incoming WebSocket messages."""
-    message_type = message.get("type")
+    handler = MESSAGE_HANDLERS.get(message.get("type"), _unknown_message)
     
     try:
-        if message_type == "subscribe_workflow":
-            workflow_id = message.get("workflow_id")
-            if workflow_id:
-                manager.subscribe_to_workflow(user_id, workflow_id)
-                await manager.send_personal_message({
-                    "type": "subscription_confirmed",
-                    "subscription_type": "workflow",
-                    "workflow_id": workflow_id,
-                    "message": f"Subscribed to workflow {workflow_id}"
-                }, websocket)
-        
-        elif message_type == "unsubscribe_workflow":
-            workflow_id = message.get("workflow_id")
-            if workflow_id:
-                manager.unsubscribe_from_workflow(user_id, workflow_id)
-                await manager.send_personal_message({
-                    "type": "subscription_cancelled",
-                    "subscription_type": "workflow",
-                    "workflow_id": workflow_id,
-                    "message": f"Unsubscribed from workflow {workflow_id}"
-                }, websocket)
-        
-        elif message_type == "subscribe_execution":
-            execution_id = message.get("execution_id")
-            if execution_id:
-                manager.subscribe_to_execution(user_id, execution_id)
-                await manager.send_personal_message({
-                    "type": "subscription_confirmed",
-                    "subscription_type": "execution",
-                    "execution_id": execution_id,
-                    "message": f"Subscribed to execution {execution_id}"
-                }, websocket)
-        
-        elif message_type == "unsubscribe_execution":
-            execution_id = message.get("execution_id")
-            if execution_id:
-                manager.unsubscribe_from_execution(user_id, execution_id)
-                await manager.send_personal_message({
-                    "type": "subscription_cancelled",
-                    "subscription_type": "execution",
-                    "execution_id": execution_id,
-                    "message": f"Unsubscribed from execution {execution_id}"
-                }, websocket)
-        
-        elif message_type == "ping":
-            await manager.send_personal_message({
-                "type": "pong",
-                "timestamp": message.get("timestamp")
-            }, websocket)
-        
-        elif message_type == "get_stats":
-            stats = manager.get_connection_stats()
-            await manager.send_personal_message({
-                "type": "stats",
-                "data": stats
-            }, websocket)
-        
-        else:
-            await manager.send_personal_message({
-                "type": "error",
-                "message": f"Unknown message type: {message_type}"
-            }, websocket)
-            
+        await handler(message, user_id, websocket)
     except Exception as e:
         logger.error(f"Error handling WebSocket message: {e}")
         await manager.send_personal_message({
@@ -3,6 +3,8 @@ Workflow management endpoints.
 """
 from typing import List
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.api.deps import get_current_active_user
@@ -22,16 +24,15 @@ def create_workflow(
     db_workflow = Workflow(
         name=workflow.name,
         description=workflow.description,
-        definition=workflow.definition,
+        definition=workflow.definition.model_dump(exclude_unset=True),
         user_id=current_user.id
     )
     db.add(db_workflow)
     db.commit()
-    db.refresh(db_workflow)
     return db_workflow
 
 
-@router.get("/", response_model=List[WorkflowResponse])
+@router.get("/", response_model=List[WorkflowResponse], response_class=ORJSONResponse)
 def list_workflows(
     skip: int = 0,
     limit: int = 100,
@@ -39,10 +40,23 @@ def list_workflows(
     current_user: User = Depends(get_current_active_user)
 ):
     """List user's workflows."""
-    workflows = db.query(Workflow).filter(
-        Workflow.user_id == current_user.id
-    ).offset(skip).limit(limit).all()
-    return workflows
+    # Select only the response columns and serialize the rows directly,
+    # skipping ORM and Pydantic model construction for every row
+    rows = db.execute(
+        select(
+            Workflow.id,
+            Workflow.user_id,
+            Workflow.name,
+            Workflow.description,
+            Workflow.definition,
+            Workflow.status,
+            Workflow.created_at,
+            Workflow.updated_at
+        ).where(
+            Workflow.user_id == current_user.id
+        ).offset(skip).limit(limit)
+    ).mappings().all()
+    return ORJSONResponse([dict(row) for row in rows])
 
 
 @router.get("/{workflow_id}", response_model=WorkflowResponse)
@@ -85,12 +99,11 @@ def update_workflow(
             detail="Workflow not found"
         )
     
-    update_data = workflow_update.dict(exclude_unset=True)
+    update_data = workflow_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(workflow, field, value)
     
     db.commit()
-    db.refresh(workflow)
     return workflow
 
 
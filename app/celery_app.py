@@ -24,13 +24,22 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
-    result_expires=3600,  # 1 hour
+    result_expires=600,  # 10 minutes; results only carry a status summary
 )
 
 # Task routing
 celery_app.conf.task_routes = {
-    "app.tasks.workflow_tasks.execute_workflow": {"queue": "workflow_execution"},
-    "app.tasks.workflow_tasks.process_webhook": {"queue": "webhook_processing"},
+    "app.tasks.workflow_tasks.execute_workflow_task": {"queue": "workflow_execution"},
+    # Webhook deliveries are retried upstream, so they skip broker persistence
+    "app.tasks.workflow_tasks.process_webhook_task": {"queue": "webhooks_transient", "delivery_mode": 1},
+}
+
+# Periodic tasks, run by the celery-beat service
+celery_app.conf.beat_schedule = {
+    "maintain-execution-log-partitions": {
+        "task": "app.tasks.workflow_tasks.maintain_execution_log_partitions_task",
+        "schedule": 24 * 60 * 60,  # daily
+    },
 }
 
 if __name__ == "__main__":
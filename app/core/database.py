@@ -1,7 +1,11 @@
 """
 Database configuration and session management.
 """
-from sqlalchemy import create_engine
+from typing import Optional
+import asyncpg
+import orjson
+from sqlalchemy import Enum, create_engine, event
+from sqlalchemy.exc import DisconnectionError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
@@ -9,18 +13,57 @@ from app.core.config import settings
 # Synchronous database engine
 engine = create_engine(
     settings.database_url,
-    pool_pre_ping=True,
-    pool_recycle=300,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_recycle=settings.db_pool_recycle,
+    # Reuse the most recently returned connection so idle ones can be recycled
+    pool_use_lifo=True,
+    connect_args=(
+        {"options": f"-c statement_timeout={settings.db_statement_timeout_ms}"}
+        if settings.db_statement_timeout_ms > 0 else {}
+    ),
+    # JSON/JSONB payloads go through orjson rather than the stdlib encoder
+    json_serializer=lambda value: orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode(),
+    json_deserializer=orjson.loads,
     echo=settings.debug
 )
 
-# Session makers
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+@event.listens_for(engine, "checkout")
+def _check_connection_alive(dbapi_connection, connection_record, connection_proxy):
+    """Cheaply reject connections the server has already closed.
+    
+    Without pre-ping, raising DisconnectionError here makes the pool discard
+    the connection and retry the checkout with a fresh one.
+    """
+    if getattr(dbapi_connection, "closed", 0):
+        raise DisconnectionError()
+
+# Session makers; request-scoped sessions keep loaded state after commit so
+# responses can be serialized without reloading every committed instance
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Base class for all models
 Base = declarative_base()
 
 
+def string_enum(enum_class, name: str) -> Enum:
+    """Column type storing a Python enum's values as VARCHAR guarded by a CHECK constraint.
+    
+    Unlike native Postgres ENUM types, new values only need the constraint
+    replaced rather than an ALTER TYPE, and the driver decodes plain strings.
+    """
+    return Enum(
+        enum_class,
+        name=name,
+        native_enum=False,
+        create_constraint=True,
+        length=16,
+        values_callable=lambda members: [member.value for member in members]
+    )
+
+
 def get_db():
     """Dependency to get database session."""
     db = SessionLocal()
@@ -30,4 +73,29 @@ def get_db():
         db.close()
 
 
-# Removed async database functionality for simplicity
\ No newline at end of file
+# Lightweight asyncpg pool for hot paths that only need raw SQL
+async_pool: Optional[asyncpg.Pool] = None
+
+
+async def init_async_pool():
+    """Create the asyncpg connection pool."""
+    global async_pool
+    async_pool = await asyncpg.create_pool(
+        settings.database_url,
+        min_size=settings.async_pool_min_size,
+        max_size=settings.async_pool_max_size,
+        statement_cache_size=settings.async_statement_cache_size
+    )
+
+
+async def close_async_pool():
+    """Close the asyncpg connection pool."""
+    global async_pool
+    if async_pool is not None:
+        await async_pool.close()
+        async_pool = None
+
+
+def acquire_async_conn():
+    """Acquire a raw asyncpg connection for a short-lived query outside a dependency."""
+    return async_pool.acquire()
@@ -1,47 +1,180 @@
 """
 Monitoring and metrics collection for the workflow engine.
 """
+import os
 import time
+import threading
 import psutil
 import logging
-from typing import Dict, Any, List
-from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from datetime import datetime
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text
-from app.core.database import get_db
-from app.models import Workflow, Execution, User, ExecutionLog
+from sqlalchemy import text
+from app.core.database import get_db, engine
 from app.celery_app import celery_app
 
 logger = logging.getLogger(__name__)
 
+# Seconds a disk usage reading is reused before statvfs is called again
+DISK_SAMPLE_MAX_AGE = 2.0
+
+# Estimated table sizes, exact 24h activity and database size in one query
+DATABASE_STATS_SQL = text("""
+    SELECT
+        (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass('users')) AS users,
+        (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass('workflows')) AS workflows,
+        (SELECT GREATEST(reltuples, 0)::bigint FROM pg_class WHERE oid = to_regclass('executions')) AS executions,
+        -- execution_logs is a partitioned parent, which is never analyzed, so
+        -- its estimate is the sum over the monthly partitions
+        (SELECT COALESCE(sum(GREATEST(c.reltuples, 0)), 0)::bigint
+         FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+         WHERE i.inhparent = to_regclass('execution_logs')) AS logs,
+        (SELECT count(*) FROM executions WHERE created_at >= now() - interval '1 day') AS executions_24h,
+        pg_size_pretty(pg_database_size(current_database())) AS database_size
+""")
+
+# Status distributions plus 24h error and duration stats in one query
+APPLICATION_STATS_SQL = text("""
+    WITH wf AS (
+        SELECT status, count(*) AS count
+        FROM workflows
+        GROUP BY status
+    ),
+    ex AS (
+        SELECT status, count(*) AS count
+        FROM executions
+        GROUP BY status
+    ),
+    recent AS (
+        SELECT
+            count(*) AS total_24h,
+            count(*) FILTER (WHERE status = 'failed') AS failed_24h,
+            avg(extract(epoch FROM completed_at - started_at)) AS avg_duration,
+            min(extract(epoch FROM completed_at - started_at)) AS min_duration,
+            max(extract(epoch FROM completed_at - started_at)) AS max_duration,
+            count(completed_at - started_at) AS sample_size
+        FROM executions
+        WHERE created_at >= now() - interval '1 day'
+    )
+    SELECT
+        (SELECT json_object_agg(status, count) FROM wf) AS workflow_status,
+        (SELECT json_object_agg(status, count) FROM ex) AS execution_status,
+        recent.*
+    FROM recent
+""")
+
 
 class SystemMonitor:
     """System monitoring and metrics collection."""
     
     def __init__(self):
         self.start_time = datetime.utcnow()
+        # Invariant for the lifetime of the process
+        self._cpu_count = psutil.cpu_count()
+        self._process = psutil.Process(os.getpid())
+        # Latest resource snapshot, replaced wholesale by the background sampler
+        self._resource_sample: Optional[Dict[str, Any]] = None
+        self._sampler: Optional[threading.Thread] = None
+        self._sample_interval = 1.0
+        self._stop_sampling = threading.Event()
+    
+    def start_sampling(self, interval: float = 1.0):
+        """Start sampling system resources in a background thread."""
+        if self._is_sampling():
+            return
+        
+        self._sample_interval = interval
+        self._stop_sampling.clear()
+        self._sampler = threading.Thread(
+            target=self._run_sampler,
+            args=(interval,),
+            name="system-monitor-sampler",
+            daemon=True
+        )
+        self._sampler.start()
+    
+    def stop_sampling(self):
+        """Stop the background resource sampler."""
+        self._stop_sampling.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=5)
+            self._sampler = None
+    
+    def _run_sampler(self, interval: float):
+        """Refresh the resource snapshot at a fixed cadence."""
+        while True:
+            try:
+                self._resource_sample = self._sample_resources()
+            except Exception as e:
+                logger.error(f"Error sampling system resources: {e}")
+            if self._stop_sampling.wait(interval):
+                break
+    
+    def _sample_resources(self) -> Dict[str, Any]:
+        """Take a non-blocking snapshot of system resources."""
+        now = time.monotonic()
+        
+        # Disk usage moves slowly; reuse a recent statvfs result
+        previous = self._resource_sample
+        if previous is not None and now - previous["disk_sampled_at"] < DISK_SAMPLE_MAX_AGE:
+            disk = previous["disk"]
+            disk_sampled_at = previous["disk_sampled_at"]
+        else:
+            disk = psutil.disk_usage('/')
+            disk_sampled_at = now
+        
+        return {
+            "sampled_at": now,
+            # interval=None measures CPU time since the previous call
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory": psutil.virtual_memory(),
+            "disk": disk,
+            "disk_sampled_at": disk_sampled_at,
+            "network": psutil.net_io_counters(),
+            "process_memory": self._process.memory_info()
+        }
+    
+    def _get_resource_sample(self) -> Dict[str, Any]:
+        """Return the latest snapshot, sampling inline if it is stale and the sampler isn't running."""
+        sample = self._resource_sample
+        if sample is None or (
+            not self._is_sampling()
+            and time.monotonic() - sample["sampled_at"] >= self._sample_interval
+        ):
+            sample = self._sample_resources()
+            self._resource_sample = sample
+        return sample
+    
+    def _is_sampling(self) -> bool:
+        """Whether the background sampler is currently running."""
+        return self._sampler is not None and self._sampler.is_alive()
     
     def get_system_metrics(self) -> Dict[str, Any]:
         """Get system resource metrics."""
         try:
+            sample = self._get_resource_sample()
+            
             # CPU metrics
-            cpu_percent = psutil.cpu_percent(interval=1)
-            cpu_count = psutil.cpu_count()
+            cpu_percent = sample["cpu_percent"]
+            cpu_count = self._cpu_count
             
             # Memory metrics
-            memory = psutil.virtual_memory()
+            memory = sample["memory"]
             memory_percent = memory.percent
             memory_used = memory.used
             memory_total = memory.total
             
             # Disk metrics
-            disk = psutil.disk_usage('/')
+            disk = sample["disk"]
             disk_percent = disk.percent
             disk_used = disk.used
             disk_total = disk.total
             
             # Network metrics (if available)
-            network = psutil.net_io_counters()
+            network = sample["network"]
+            
+            # This process's own footprint
+            process_memory = sample["process_memory"]
             
             return {
                 "timestamp": datetime.utcnow().isoformat(),
@@ -67,6 +200,11 @@ class SystemMonitor:
                     "bytes_recv": network.bytes_recv,
                     "packets_sent": network.packets_sent,
                     "packets_recv": network.packets_recv
+                },
+                "process": {
+                    "pid": self._process.pid,
+                    "rss_bytes": process_memory.rss,
+                    "vms_bytes": process_memory.vms
                 }
             }
         except Exception as e:
@@ -83,25 +221,15 @@ class SystemMonitor:
             checked_out = pool.checkedout()
             overflow = pool.overflow()
             
-            # Table counts
-            user_count = db.query(func.count(User.id)).scalar()
-            workflow_count = db.query(func.count(Workflow.id)).scalar()
-            execution_count = db.query(func.count(Execution.id)).scalar()
-            log_count = db.query(func.count(ExecutionLog.id)).scalar()
-            
-            # Recent activity (last 24 hours)
-            yesterday = datetime.utcnow() - timedelta(days=1)
-            recent_executions = db.query(func.count(Execution.id)).filter(
-                Execution.created_at >= yesterday
-            ).scalar()
-            
-            # Database size (PostgreSQL specific)
-            try:
-                db_size_result = db.execute(text(
-                    "SELECT pg_size_pretty(pg_database_size(current_database()))"
-                )).scalar()
-            except:
-                db_size_result = "Unknown"
+            # Table sizes come from the planner's row estimates, which avoids a
+            # full scan per table; everything is fetched in a single round trip
+            stats = db.execute(DATABASE_STATS_SQL).one()
+            user_count = stats.users
+            workflow_count = stats.workflows
+            execution_count = stats.executions
+            log_count = stats.logs
+            recent_executions = stats.executions_24h
+            db_size_result = stats.database_size
             
             return {
                 "timestamp": datetime.utcnow().isoformat(),
@@ -150,7 +278,7 @@ class SystemMonitor:
                 if isinstance(celery_app.backend, RedisBackend):
                     redis_client = celery_app.backend.client
                     queue_lengths = {}
-                    for queue in ['celery', 'workflow_execution', 'webhook_processing']:
+                    for queue in ['celery', 'workflow_execution', 'webhooks_transient']:
                         length = redis_client.llen(queue)
                         queue_lengths[queue] = length
                 else:
@@ -173,55 +301,13 @@ class SystemMonitor:
     def get_application_metrics(self, db: Session) -> Dict[str, Any]:
         """Get application-specific metrics."""
         try:
-            # Workflow status distribution
-            workflow_status_query = db.query(
-                Workflow.status,
-                func.count(Workflow.id).label('count')
-            ).group_by(Workflow.status).all()
-            
-            workflow_status = {status: count for status, count in workflow_status_query}
-            
-            # Execution status distribution
-            execution_status_query = db.query(
-                Execution.status,
-                func.count(Execution.id).label('count')
-            ).group_by(Execution.status).all()
+            stats = db.execute(APPLICATION_STATS_SQL).one()
             
-            execution_status = {status.value: count for status, count in execution_status_query}
-            
-            # Recent execution performance
-            recent_executions = db.query(Execution).filter(
-                Execution.completed_at.isnot(None),
-                Execution.started_at.isnot(None),
-                Execution.created_at >= datetime.utcnow() - timedelta(hours=24)
-            ).all()
-            
-            if recent_executions:
-                durations = []
-                for execution in recent_executions:
-                    if execution.started_at and execution.completed_at:
-                        duration = (execution.completed_at - execution.started_at).total_seconds()
-                        durations.append(duration)
-                
-                if durations:
-                    avg_duration = sum(durations) / len(durations)
-                    min_duration = min(durations)
-                    max_duration = max(durations)
-                else:
-                    avg_duration = min_duration = max_duration = 0
-            else:
-                avg_duration = min_duration = max_duration = 0
-            
-            # Error rate (last 24 hours)
-            total_executions_24h = db.query(func.count(Execution.id)).filter(
-                Execution.created_at >= datetime.utcnow() - timedelta(days=1)
-            ).scalar()
-            
-            failed_executions_24h = db.query(func.count(Execution.id)).filter(
-                Execution.created_at >= datetime.utcnow() - timedelta(days=1),
-                Execution.status == 'FAILED'
-            ).scalar()
+            workflow_status = stats.workflow_status or {}
+            execution_status = stats.execution_status or {}
             
+            total_executions_24h = stats.total_24h
+            failed_executions_24h = stats.failed_24h
             error_rate = (failed_executions_24h / total_executions_24h * 100) if total_executions_24h > 0 else 0
             
             return {
@@ -229,10 +315,10 @@ class SystemMonitor:
                 "workflow_status_distribution": workflow_status,
                 "execution_status_distribution": execution_status,
                 "execution_performance": {
-                    "avg_duration_seconds": avg_duration,
-                    "min_duration_seconds": min_duration,
-                    "max_duration_seconds": max_duration,
-                    "sample_size": len(recent_executions)
+                    "avg_duration_seconds": float(stats.avg_duration or 0),
+                    "min_duration_seconds": float(stats.min_duration or 0),
+                    "max_duration_seconds": float(stats.max_duration or 0),
+                    "sample_size": stats.sample_size
                 },
                 "error_metrics": {
                     "error_rate_24h_percent": error_rate,
@@ -244,15 +330,19 @@ class SystemMonitor:
             logger.error(f"Error collecting application metrics: {e}")
             return {"error": str(e)}
     
-    def get_health_status(self, db: Session) -> Dict[str, Any]:
-        """Get overall health status."""
+    def get_health_status(self, db: Optional[Session] = None) -> Dict[str, Any]:
+        """Get overall health status, probing a pooled connection if no session is given."""
         try:
             health_checks = {}
             overall_status = "healthy"
             
             # Database health
             try:
-                db.execute(text("SELECT 1")).scalar()
+                if db is not None:
+                    db.execute(text("SELECT 1")).scalar()
+                else:
+                    with engine.connect() as conn:
+                        conn.scalar(text("SELECT 1"))
                 health_checks["database"] = {"status": "healthy", "message": "Database connection OK"}
             except Exception as e:
                 health_checks["database"] = {"status": "unhealthy", "message": f"Database error: {e}"}
@@ -274,8 +364,9 @@ class SystemMonitor:
             
             # System resources health
             try:
-                memory = psutil.virtual_memory()
-                disk = psutil.disk_usage('/')
+                sample = self._get_resource_sample()
+                memory = sample["memory"]
+                disk = sample["disk"]
                 
                 if memory.percent > 90:
                     health_checks["memory"] = {"status": "critical", "message": f"High memory usage: {memory.percent}%"}
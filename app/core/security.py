@@ -1,15 +1,41 @@
 """
 Security utilities for authentication and authorization.
 """
+import hashlib
+import hmac
+import secrets
+import threading
+import time
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Optional, Dict, Any
+from cachetools import TTLCache
 from passlib.context import CryptContext
-from jose import JWTError, jwt
+from jose import JWTError, jwk, jwt
 from fastapi import HTTPException, status
 from app.core.config import settings
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.password_hash_rounds
+)
+
+# Signing key and allowed algorithms, built once instead of on every
+# encode/decode (a str key is otherwise re-parsed as JSON and re-wrapped)
+_JWT_KEY = jwk.construct(settings.secret_key, settings.algorithm)
+_JWT_ALGORITHMS = [settings.algorithm]
+
+# Recently verified JWT claims, keyed by SHA-256 digest of the token
+_token_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=settings.auth_cache_size, ttl=settings.auth_cache_ttl)
+    if settings.auth_cache_ttl > 0 else None
+)
+_token_cache_lock = threading.Lock()
+
+# BLAKE2b accepts keys of up to 64 bytes; derive one from the application secret
+_API_KEY_HASH_KEY = hashlib.sha256(settings.secret_key.encode()).digest()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -17,6 +43,20 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+@lru_cache(maxsize=1)
+def _get_dummy_password_hash() -> str:
+    """Hash checked for unknown users so failed logins take the same time."""
+    return get_password_hash(secrets.token_urlsafe(16))
+
+
+def verify_password_or_dummy(plain_password: str, hashed_password: Optional[str]) -> bool:
+    """Verify a password, doing equivalent work when there is no hash to check."""
+    if hashed_password is None:
+        verify_password(plain_password, _get_dummy_password_hash())
+        return False
+    return verify_password(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
@@ -28,17 +68,40 @@ def create_access_token(data: Dict[str, Any], expires_delta: Optional[timedelta]
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _JWT_KEY, algorithm=settings.algorithm)
     return encoded_jwt
 
 
 def verify_token(token: str) -> Dict[str, Any]:
-    """Verify JWT token and return payload."""
+    """Verify JWT token and return payload, reusing recent verifications when cached."""
+    if _token_cache is None:
+        return _decode_token(token)
+    
+    key = hashlib.sha256(token.encode()).digest()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    
+    if cached is not None:
+        exp = cached.get("exp")
+        # Never serve a token past its own expiry, even within the cache TTL
+        if exp is None or exp > time.time():
+            return cached
+        with _token_cache_lock:
+            _token_cache.pop(key, None)
+    
+    payload = _decode_token(token)
+    with _token_cache_lock:
+        _token_cache[key] = payload
+    return payload
+
+
+def _decode_token(token: str) -> Dict[str, Any]:
+    """Decode and verify a JWT without consulting the cache."""
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = jwt.decode(token, _JWT_KEY, algorithms=_JWT_ALGORITHMS)
         return payload
     except JWTError:
         raise HTTPException(
@@ -50,18 +113,33 @@ def verify_token(token: str) -> Dict[str, Any]:
 
 def create_api_key() -> str:
     """Generate a new API key."""
-    import secrets
     return f"wf_{secrets.token_urlsafe(32)}"
 
 
 def hash_api_key(api_key: str) -> str:
-    """Hash an API key for storage."""
-    return get_password_hash(api_key)
+    """Hash an API key for storage.
+    
+    API keys are 256-bit random tokens, so a keyed BLAKE2b MAC is as strong as
+    a slow KDF here while costing microseconds instead of a bcrypt round.
+    """
+    return hashlib.blake2b(
+        api_key.encode(),
+        key=_API_KEY_HASH_KEY,
+        digest_size=32
+    ).hexdigest()
+
+
+def get_api_key_lookup_hash(api_key: str) -> str:
+    """Derive the indexed lookup hash for an API key."""
+    return hashlib.sha256(api_key.encode()).hexdigest()
 
 
 def verify_api_key(api_key: str, hashed_key: str) -> bool:
     """Verify an API key against its hash."""
-    return verify_password(api_key, hashed_key)
+    if pwd_context.identify(hashed_key):
+        # Keys issued before the switch to BLAKE2b are still bcrypt hashes
+        return verify_password(api_key, hashed_key)
+    return hmac.compare_digest(hash_api_key(api_key), hashed_key)
 
 
 def decode_access_token(token: str) -> Dict[str, Any]:
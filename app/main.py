@@ -1,11 +1,12 @@
 import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 
 from app.core.config import settings
-from app.core.database import engine, Base
+from app.core.database import engine, Base, init_async_pool, close_async_pool
 from app.api.v1.api import api_router
 
 # Configure logging
@@ -30,14 +31,26 @@ async def lifespan(app: FastAPI):
     Base.metadata.create_all(bind=engine)
     logger.info("Database tables created")
     
+    # Make sure this month's execution log partitions exist
+    from app.models import ExecutionLog
+    with engine.begin() as conn:
+        ExecutionLog.ensure_partitions(conn)
+    
+    # Open the asyncpg pool used by raw-SQL hot paths
+    await init_async_pool()
+    logger.info("Async database pool initialized")
+    
     # Initialize monitoring
     from app.core.monitoring import monitor
+    monitor.start_sampling(settings.metrics_sample_interval)
     logger.info("Monitoring system initialized")
     
     yield
     
     # Shutdown
     logger.info("Shutting down workflow engine...")
+    await close_async_pool()
+    monitor.stop_sampling()
 
 
 # Create FastAPI app
@@ -45,6 +58,7 @@ app = FastAPI(
     title="Workflow Engine API",
     description="A powerful workflow automation engine with n8n integration",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -53,10 +67,11 @@ app = FastAPI(
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=settings.allowed_hosts,
+    # Starlette checks origins with `in`, so hand it a set
+    allow_origins=settings.allowed_origins_set,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=settings.allowed_methods,
+    allow_headers=settings.allowed_headers,
 )
 
 # Add trusted host middleware
@@ -7,6 +7,7 @@ from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
 from app.core.database import Base
+from app.core.security import get_api_key_lookup_hash, hash_api_key
 
 
 class APIKey(Base):
@@ -16,14 +17,25 @@ class APIKey(Base):
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
-    key_hash = Column(String(255), nullable=False, index=True)
+    key_hash = Column(String(255), nullable=False)
+    # NULL for keys issued before lookup hashes were stored until they are next used
+    lookup_hash = Column(String(64), unique=True, index=True)
     name = Column(String(100), nullable=False)
-    permissions = Column(JSONB, default={})
+    permissions = Column(JSONB, default=dict)
     expires_at = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
     user = relationship("User", back_populates="api_keys")
     
+    @classmethod
+    def for_key(cls, api_key: str, **kwargs) -> "APIKey":
+        """Build the row for a newly issued key, storing only its hashes."""
+        return cls(
+            key_hash=hash_api_key(api_key),
+            lookup_hash=get_api_key_lookup_hash(api_key),
+            **kwargs
+        )
+    
     def __repr__(self):
         return f"<APIKey(id={self.id}, user_id={self.user_id}, name={self.name})>"
\ No newline at end of file
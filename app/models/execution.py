@@ -1,13 +1,13 @@
 """
 Execution model for workflow execution tracking.
 """
-from sqlalchemy import Column, String, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
 import enum
-from app.core.database import Base
+from app.core.database import Base, string_enum
 
 
 class ExecutionStatus(str, enum.Enum):
@@ -23,13 +23,36 @@ class Execution(Base):
     """Execution model for workflow executions."""
     
     __tablename__ = "executions"
+    __table_args__ = (
+        # Per-workflow execution history, newest first
+        Index("ix_executions_workflow_id_created_at", "workflow_id", "created_at"),
+        # Executions per workflow in a given state, e.g. running ones
+        Index("ix_executions_workflow_id_status", "workflow_id", "status"),
+        # 24h monitoring windows, optionally filtered by status
+        Index("ix_executions_created_at_status", "created_at", "status"),
+        # Compact range index; created_at grows with insertion order
+        Index("ix_executions_created_at_brin", "created_at", postgresql_using="brin"),
+        # JSONB containment (@>) lookups on execution payloads
+        Index(
+            "ix_executions_input_data_gin", "input_data",
+            postgresql_using="gin",
+            postgresql_ops={"input_data": "jsonb_path_ops"},
+        ),
+        Index(
+            "ix_executions_output_data_gin", "output_data",
+            postgresql_using="gin",
+            postgresql_ops={"output_data": "jsonb_path_ops"},
+        ),
+    )
+    # Fetch the server-generated created_at with RETURNING on INSERT
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     workflow_id = Column(UUID(as_uuid=True), ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False)
-    input_data = Column(JSONB, default={})
+    input_data = Column(JSONB, default=dict)
     output_data = Column(JSONB)
-    execution_metadata = Column(JSONB, default={})
-    status = Column(Enum(ExecutionStatus), default=ExecutionStatus.PENDING, nullable=False)
+    execution_metadata = Column(JSONB, default=dict)
+    status = Column(string_enum(ExecutionStatus, "ck_execution_status"), default=ExecutionStatus.PENDING, nullable=False)
     error_message = Column(Text)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     started_at = Column(DateTime(timezone=True))
@@ -37,7 +60,7 @@ class Execution(Base):
     
     # Relationships
     workflow = relationship("Workflow", back_populates="executions")
-    logs = relationship("ExecutionLog", back_populates="execution", cascade="all, delete-orphan")
+    logs = relationship("ExecutionLog", back_populates="execution", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Execution(id={self.id}, workflow_id={self.workflow_id}, status={self.status})>"
\ No newline at end of file
@@ -1,13 +1,19 @@
 """
 Execution Log model for tracking workflow execution logs.
 """
-from sqlalchemy import Column, String, Text, DateTime, Enum, ForeignKey
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+from sqlalchemy import DDL, Column, String, Text, DateTime, ForeignKey, event, insert, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import Session, relationship
 from sqlalchemy.sql import func
 import uuid
 import enum
-from app.core.database import Base
+from app.core.database import Base, string_enum
+
+logger = logging.getLogger(__name__)
 
 
 class LogLevel(str, enum.Enum):
@@ -22,16 +28,58 @@ class ExecutionLog(Base):
     """Execution Log model for tracking workflow execution logs."""
     
     __tablename__ = "execution_logs"
+    # Monthly range partitions keep each partition's indexes small as logs grow;
+    # the partition key has to be part of the primary key
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     execution_id = Column(UUID(as_uuid=True), ForeignKey("executions.id", ondelete="CASCADE"), nullable=False)
-    level = Column(Enum(LogLevel), default=LogLevel.INFO, nullable=False)
+    level = Column(string_enum(LogLevel, "ck_execution_log_level"), default=LogLevel.INFO, nullable=False)
     message = Column(Text, nullable=False)
     log_metadata = Column(JSONB)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
     
     # Relationships
     execution = relationship("Execution", back_populates="logs")
     
+    @classmethod
+    def bulk_write(cls, session: Session, rows: List[Dict[str, Any]]) -> None:
+        """Insert many log rows with one batched INSERT, without loading them back.
+        
+        Rows should carry their own id and created_at so nothing has to be
+        fetched with RETURNING.
+        """
+        if rows:
+            session.execute(insert(cls), rows)
+    
+    @classmethod
+    def ensure_partitions(cls, connection: Connection, months_ahead: int = 1) -> None:
+        """Create the monthly partitions for the current month and the next few."""
+        now = datetime.now(timezone.utc)
+        year, month = now.year, now.month
+        for _ in range(months_ahead + 1):
+            next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+            partition = f"{cls.__tablename__}_{year:04d}_{month:02d}"
+            try:
+                # Savepoint so one failed partition doesn't abort the others
+                with connection.begin_nested():
+                    connection.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {cls.__tablename__} "
+                        f"FOR VALUES FROM ('{year:04d}-{month:02d}-01 00:00:00+00') "
+                        f"TO ('{next_year:04d}-{next_month:02d}-01 00:00:00+00')"
+                    ))
+            except Exception as e:
+                # Typically rows for this month already landed in the default partition
+                logger.warning(f"Could not create partition {partition}: {e}")
+            year, month = next_year, next_month
+    
     def __repr__(self):
-        return f"<ExecutionLog(id={self.id}, execution_id={self.execution_id}, level={self.level})>"
\ No newline at end of file
+        return f"<ExecutionLog(id={self.id}, execution_id={self.execution_id}, level={self.level})>"
+
+
+# Catch-all partition so inserts never fail for lack of a monthly partition
+event.listen(
+    ExecutionLog.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS execution_logs_default PARTITION OF execution_logs DEFAULT")
+)
@@ -1,12 +1,12 @@
 """
 Integration model for external service integrations.
 """
-from sqlalchemy import Column, String, DateTime, Enum
+from sqlalchemy import Column, String, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.sql import func
 import uuid
 import enum
-from app.core.database import Base
+from app.core.database import Base, string_enum
 
 
 class IntegrationStatus(str, enum.Enum):
@@ -20,13 +20,19 @@ class Integration(Base):
     """Integration model for external service integrations."""
     
     __tablename__ = "integrations"
+    __table_args__ = (
+        # One integration per service; create_integration looks it up by name
+        Index("ix_integrations_service_name", "service_name", unique=True),
+    )
+    # Fetch server-generated timestamps with RETURNING on INSERT and UPDATE
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     service_name = Column(String(100), nullable=False)
     service_url = Column(String(500))
     credentials = Column(JSONB)
     configuration = Column(JSONB)
-    status = Column(Enum(IntegrationStatus), default=IntegrationStatus.INACTIVE, nullable=False)
+    status = Column(string_enum(IntegrationStatus, "ck_integration_status"), default=IntegrationStatus.INACTIVE, nullable=False)
     last_sync = Column(DateTime(timezone=True))
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,7 +1,7 @@
 """
 Webhook model for webhook management.
 """
-from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, String, Boolean, DateTime, ForeignKey, Index, UniqueConstraint, text
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -13,10 +13,24 @@ class Webhook(Base):
     """Webhook model for webhook management."""
     
     __tablename__ = "webhooks"
+    __table_args__ = (
+        # Replaces the old unique index on url_path alone; create_all leaves
+        # existing tables untouched, so databases created before need:
+        #   ALTER TABLE webhooks ADD CONSTRAINT uq_webhook_path_method UNIQUE (url_path, method);
+        #   DROP INDEX CONCURRENTLY ix_webhooks_url_path;
+        #   CREATE INDEX CONCURRENTLY ix_webhook_dispatch ON webhooks (url_path, method, is_active) WHERE is_active;
+        UniqueConstraint("url_path", "method", name="uq_webhook_path_method"),
+        # Partial index serving the dispatch lookup in handle_webhook
+        Index(
+            "ix_webhook_dispatch",
+            "url_path", "method", "is_active",
+            postgresql_where=text("is_active"),
+        ),
+    )
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     workflow_id = Column(UUID(as_uuid=True), ForeignKey("workflows.id", ondelete="CASCADE"), nullable=False)
-    url_path = Column(String(255), unique=True, nullable=False, index=True)
+    url_path = Column(String(255), nullable=False)
     method = Column(String(10), default="POST", nullable=False)
     headers = Column(JSONB)
     is_active = Column(Boolean, default=True, nullable=False)
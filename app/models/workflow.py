@@ -1,13 +1,13 @@
 """
 Workflow model for workflow definition and management.
 """
-from sqlalchemy import Column, String, Text, DateTime, Enum, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 import uuid
 import enum
-from app.core.database import Base
+from app.core.database import Base, string_enum
 
 
 class WorkflowStatus(str, enum.Enum):
@@ -22,21 +22,37 @@ class Workflow(Base):
     """Workflow model for workflow definition and management."""
     
     __tablename__ = "workflows"
+    __table_args__ = (
+        # Every owned-workflow lookup filters on (user_id, id); listings use the prefix
+        Index("ix_workflows_user_id_id", "user_id", "id"),
+        # n8n sync matches a user's workflows by name; listings may filter by status
+        Index("ix_workflows_user_name", "user_id", "name"),
+        Index("ix_workflows_user_status", "user_id", "status"),
+        # JSONB containment (@>) lookups, e.g. n8n_metadata.original_id on sync
+        Index(
+            "ix_workflows_definition_gin", "definition",
+            postgresql_using="gin",
+            postgresql_ops={"definition": "jsonb_path_ops"},
+        ),
+    )
+    # Fetch server-generated timestamps with RETURNING on INSERT and UPDATE
+    __mapper_args__ = {"eager_defaults": True}
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     name = Column(String(255), nullable=False)
     description = Column(Text)
     definition = Column(JSONB, nullable=False)
-    status = Column(Enum(WorkflowStatus), default=WorkflowStatus.DRAFT, nullable=False)
+    status = Column(string_enum(WorkflowStatus, "ck_workflow_status"), default=WorkflowStatus.DRAFT, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
-    # Relationships
+    # Relationships; children are removed by ON DELETE CASCADE instead of
+    # being loaded and deleted one by one
     user = relationship("User", back_populates="workflows")
-    executions = relationship("Execution", back_populates="workflow", cascade="all, delete-orphan")
-    triggers = relationship("Trigger", back_populates="workflow", cascade="all, delete-orphan")
-    webhooks = relationship("Webhook", back_populates="workflow", cascade="all, delete-orphan")
+    executions = relationship("Execution", back_populates="workflow", cascade="all, delete-orphan", passive_deletes=True)
+    triggers = relationship("Trigger", back_populates="workflow", cascade="all, delete-orphan", passive_deletes=True)
+    webhooks = relationship("Webhook", back_populates="workflow", cascade="all, delete-orphan", passive_deletes=True)
     
     def __repr__(self):
         return f"<Workflow(id={self.id}, name={self.name}, status={self.status})>"
\ No newline at end of file
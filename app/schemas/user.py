@@ -2,7 +2,8 @@
 User schemas for API requests and responses.
 """
 from typing import Optional
-from pydantic import BaseModel, EmailStr
+from uuid import UUID
+from pydantic import BaseModel, ConfigDict, EmailStr
 from datetime import datetime
 from app.models.user import UserRole
 
@@ -11,11 +12,10 @@ class UserBase(BaseModel):
     """Base user schema."""
     email: EmailStr
     name: str
-    role: UserRole = UserRole.USER
 
 
 class UserCreate(UserBase):
-    """User creation schema."""
+    """User creation schema; the role is never taken from the client."""
     password: str
 
 
@@ -29,12 +29,12 @@ class UserUpdate(BaseModel):
 
 class UserResponse(UserBase):
     """User response schema."""
-    id: str
+    id: UUID
+    role: UserRole
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 
 class Token(BaseModel):
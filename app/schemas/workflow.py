@@ -1,39 +1,74 @@
 """
 Workflow schemas for API requests and responses.
 """
-from typing import Optional, Dict, Any
-from pydantic import BaseModel
+from typing import Optional, Dict, Any, List, Union
+from uuid import UUID
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 from app.models.workflow import WorkflowStatus
 
 
+class WorkflowNode(BaseModel):
+    """Workflow definition node schema."""
+    id: str
+    type: str
+    name: str
+    parameters: Dict[str, Any] = Field(default_factory=dict)
+    # {"x": ..., "y": ...} for workflows created here, [x, y] for n8n-synced ones
+    position: Optional[Union[Dict[str, float], List[float]]] = None
+    
+    # Keep any extra node keys (e.g. n8n metadata) when round-tripping
+    model_config = ConfigDict(extra="allow")
+
+
+class WorkflowConnection(BaseModel):
+    """Workflow definition connection schema."""
+    source: str
+    # n8n connections may point at no node
+    target: Optional[str]
+    sourceOutput: Optional[str] = None
+    targetInput: Optional[str] = None
+    
+    model_config = ConfigDict(extra="allow")
+
+
+class WorkflowDefinition(BaseModel):
+    """Workflow definition schema."""
+    nodes: List[WorkflowNode]
+    connections: List[WorkflowConnection] = Field(default_factory=list)
+    settings: Dict[str, Any] = Field(default_factory=dict)
+    
+    model_config = ConfigDict(extra="allow")
+
+
 class WorkflowBase(BaseModel):
     """Base workflow schema."""
     name: str
     description: Optional[str] = None
-    definition: Dict[str, Any]
 
 
 class WorkflowCreate(WorkflowBase):
     """Workflow creation schema."""
-    pass
+    definition: WorkflowDefinition
 
 
 class WorkflowUpdate(BaseModel):
     """Workflow update schema."""
     name: Optional[str] = None
     description: Optional[str] = None
-    definition: Optional[Dict[str, Any]] = None
+    definition: Optional[WorkflowDefinition] = None
     status: Optional[WorkflowStatus] = None
 
 
 class WorkflowResponse(WorkflowBase):
     """Workflow response schema."""
-    id: str
-    user_id: str
+    # Typed only on input: definitions stored before validation was added
+    # are returned as saved rather than failing the response
+    definition: Dict[str, Any]
+    id: UUID
+    user_id: UUID
     status: WorkflowStatus
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
@@ -1,26 +1,102 @@
 """
 n8n integration service for workflow synchronization and API integration.
 """
-import json
+import asyncio
+import uuid
+import threading
+from types import MappingProxyType
+import httpx
+import ijson
+import orjson
 import requests
+from cachetools import LRUCache, TTLCache
+from requests.adapters import HTTPAdapter
 from typing import Dict, Any, List, Optional
-from sqlalchemy.orm import Session
+from urllib3.util.retry import Retry
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.orm import Session, load_only
 from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from app.core.config import settings
-from app.models import Integration, Workflow, User
+from app.models import Integration, Workflow, WorkflowStatus, User
 from app.models.integration import IntegrationStatus
 import logging
 
 logger = logging.getLogger(__name__)
 
+# n8n workflows written per lookup/INSERT/UPDATE round during a sync
+N8N_SYNC_BATCH_SIZE = 500
+
+# Workflow exports in flight at once against the n8n API
+N8N_EXPORT_CONCURRENCY = 10
+
+# N8nService is created per request, so the HTTP session lives at module level
+# to keep connections to n8n alive across requests
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+# Recently successful connection tests, keyed by (n8n URL, API key)
+_connection_cache: Optional[TTLCache] = (
+    TTLCache(maxsize=16, ttl=settings.n8n_connection_cache_ttl)
+    if settings.n8n_connection_cache_ttl > 0 else None
+)
+_connection_cache_lock = threading.Lock()
+
+
+# Encoded n8n export bodies keyed by (workflow id, updated_at); any edit bumps
+# updated_at, so stale entries are simply never looked up again
+_export_body_cache: LRUCache = LRUCache(maxsize=1024)
+_export_body_cache_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Return the shared, connection-pooling session used for n8n API calls."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # Idempotent requests are retried on gateway errors; POSTs are not
+                adapter = HTTPAdapter(
+                    pool_connections=10,
+                    pool_maxsize=20,
+                    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_session = session
+    return _http_session
+
+# n8n node type -> internal node type
+N8N_NODE_TYPES = MappingProxyType({
+    "n8n-nodes-base.start": "start",
+    "n8n-nodes-base.httpRequest": "http_request",
+    "n8n-nodes-base.webhook": "webhook",
+    "n8n-nodes-base.set": "data_transform",
+    "n8n-nodes-base.if": "condition",
+    "n8n-nodes-base.function": "function",
+    "n8n-nodes-base.code": "code",
+    "n8n-nodes-base.merge": "merge",
+    "n8n-nodes-base.split": "split",
+    "n8n-nodes-base.wait": "wait",
+    "n8n-nodes-base.schedule": "schedule"
+})
+
+# Derived from the forward map so the two directions cannot drift apart
+INTERNAL_NODE_TYPES = MappingProxyType({
+    internal_type: n8n_type for n8n_type, internal_type in N8N_NODE_TYPES.items()
+})
+
 
 class N8nService:
     """Service for n8n integration and workflow synchronization."""
     
     def __init__(self, db: Session):
         self.db = db
-        self.n8n_url = settings.N8N_URL
-        self.n8n_api_key = settings.N8N_API_KEY
+        self.n8n_url = settings.n8n_base_url
+        self.n8n_api_key = settings.n8n_api_key
+        self.session = get_http_session()
         self.headers = {
             "Content-Type": "application/json",
             "X-N8N-API-KEY": self.n8n_api_key
@@ -28,16 +104,30 @@ class N8nService:
     
     def test_connection(self) -> bool:
         """Test connection to n8n instance."""
+        cache_key = (self.n8n_url, self.n8n_api_key)
+        if _connection_cache is not None:
+            with _connection_cache_lock:
+                if _connection_cache.get(cache_key):
+                    return True
+        
         try:
-            response = requests.get(
+            # A single workflow is enough to prove the API answers and accepts the key
+            response = self.session.get(
                 f"{self.n8n_url}/api/v1/workflows",
                 headers=self.headers,
+                params={"limit": 1},
                 timeout=10
             )
-            return response.status_code == 200
+            connected = response.status_code == 200
         except Exception as e:
             logger.error(f"Failed to connect to n8n: {str(e)}")
-            return False
+            connected = False
+        
+        # Only successes are cached so a fixed connection is noticed immediately
+        if connected and _connection_cache is not None:
+            with _connection_cache_lock:
+                _connection_cache[cache_key] = True
+        return connected
     
     def create_integration(self, user_id: str) -> Integration:
         """Create n8n integration record."""
@@ -61,7 +151,7 @@ class N8nService:
             service_url=self.n8n_url,
             credentials={"api_key": self.n8n_api_key} if self.n8n_api_key else {},
             configuration={
-                "webhook_base_url": settings.WEBHOOK_BASE_URL,
+                "webhook_base_url": settings.webhook_base_url,
                 "sync_enabled": True
             },
             status=IntegrationStatus.ACTIVE
@@ -69,111 +159,165 @@ class N8nService:
         
         self.db.add(integration)
         self.db.commit()
-        self.db.refresh(integration)
         
         return integration
     
     def sync_workflows_from_n8n(self, user_id: str) -> List[Dict[str, Any]]:
         """Sync workflows from n8n to local database."""
         try:
-            # Get workflows from n8n
-            response = requests.get(
+            # Get workflows from n8n, streaming the body instead of buffering it
+            with self.session.get(
                 f"{self.n8n_url}/api/v1/workflows",
                 headers=self.headers,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Failed to fetch workflows from n8n: {response.text}"
-                )
-            
-            n8n_workflows = response.json().get("data", [])
-            synced_workflows = []
-            
-            for n8n_workflow in n8n_workflows:
-                # Convert n8n workflow to our format
-                local_workflow = self.convert_n8n_workflow(n8n_workflow, user_id)
-                synced_workflows.append(local_workflow)
+                timeout=30,
+                stream=True
+            ) as response:
+                if response.status_code != 200:
+                    raise HTTPException(
+                        status_code=status.HTTP_400_BAD_REQUEST,
+                        detail=f"Failed to fetch workflows from n8n: {response.text}"
+                    )
+                
+                # Decode workflows one at a time and write them in batches, so
+                # parsing and database writes overlap with the download
+                response.raw.decode_content = True
+                synced_workflows = []
+                batch = []
+                for n8n_workflow in ijson.items(response.raw, "data.item", use_float=True):
+                    batch.append(n8n_workflow)
+                    if len(batch) >= N8N_SYNC_BATCH_SIZE:
+                        synced_workflows.extend(self.upsert_n8n_workflows(batch, user_id))
+                        batch = []
+                if batch:
+                    synced_workflows.extend(self.upsert_n8n_workflows(batch, user_id))
             
+            self.db.commit()
             return synced_workflows
             
         except Exception as e:
+            self.db.rollback()
             logger.error(f"Failed to sync workflows from n8n: {str(e)}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Workflow sync failed: {str(e)}"
             )
     
-    def convert_n8n_workflow(self, n8n_workflow: Dict[str, Any], user_id: str) -> Dict[str, Any]:
-        """Convert n8n workflow format to local format."""
-        workflow_id = n8n_workflow.get("id")
-        name = n8n_workflow.get("name", f"n8n_workflow_{workflow_id}")
+    def upsert_n8n_workflows(self, n8n_workflows: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+        """Create or update local copies of a batch of n8n workflows.
         
-        # Check if workflow already exists
-        existing = self.db.query(Workflow).filter(
-            Workflow.name == name,
-            Workflow.user_id == user_id
-        ).first()
+        Workflows are matched to existing ones by n8n id or name with one lookup
+        query, followed by one multi-row INSERT and one batched UPDATE in total.
+        Changes are flushed but not committed, so one sync is one transaction.
+        """
+        prepared = []
+        for n8n_workflow in n8n_workflows:
+            n8n_id = n8n_workflow.get("id")
+            name = n8n_workflow.get("name", f"n8n_workflow_{n8n_id}")
+            prepared.append((n8n_id, name, self.convert_n8n_definition(n8n_workflow)))
         
-        if existing:
-            # Update existing workflow
-            existing.definition = self.convert_n8n_definition(n8n_workflow)
-            self.db.commit()
-            return {
-                "id": str(existing.id),
-                "name": existing.name,
-                "status": "updated",
-                "n8n_id": workflow_id
-            }
-        else:
-            # Create new workflow
-            workflow = Workflow(
-                name=name,
-                description=f"Synced from n8n (ID: {workflow_id})",
-                definition=self.convert_n8n_definition(n8n_workflow),
-                user_id=user_id
+        if not prepared:
+            return []
+        
+        # Previously synced copies are found by their n8n id with JSONB
+        # containment, which the GIN index on definition serves; other local
+        # workflows are still matched by name
+        n8n_ids = {n8n_id for n8n_id, _, _ in prepared if n8n_id is not None}
+        rows = self.db.execute(
+            select(
+                Workflow.id,
+                Workflow.name,
+                Workflow.definition["n8n_metadata"]["original_id"].label("original_id")
+            ).where(
+                Workflow.user_id == user_id,
+                or_(
+                    Workflow.name.in_({name for _, name, _ in prepared}),
+                    *[
+                        Workflow.definition.contains({"n8n_metadata": {"original_id": n8n_id}})
+                        for n8n_id in n8n_ids
+                    ]
+                )
             )
-            self.db.add(workflow)
-            self.db.commit()
-            self.db.refresh(workflow)
+        ).all()
+        existing_by_n8n_id = {
+            row.original_id: row.id for row in rows
+            if isinstance(row.original_id, (str, int))
+        }
+        existing_by_name = {row.name: row.id for row in rows}
+        
+        inserts: Dict[str, Dict[str, Any]] = {}
+        updates: Dict[uuid.UUID, Dict[str, Any]] = {}
+        synced_workflows = []
+        
+        for n8n_id, name, definition in prepared:
+            workflow_id = existing_by_n8n_id.get(n8n_id) or existing_by_name.get(name)
+            if workflow_id is not None:
+                updates[workflow_id] = definition
+                sync_status = "updated"
+            elif name in inserts:
+                # A later n8n workflow with the same name overwrites the new row
+                workflow_id = inserts[name]["id"]
+                inserts[name]["definition"] = definition
+                sync_status = "updated"
+            else:
+                workflow_id = uuid.uuid4()
+                inserts[name] = {
+                    "id": workflow_id,
+                    "name": name,
+                    "description": f"Synced from n8n (ID: {n8n_id})",
+                    "definition": definition,
+                    "status": WorkflowStatus.DRAFT,
+                    "user_id": user_id
+                }
+                sync_status = "created"
             
-            return {
-                "id": str(workflow.id),
-                "name": workflow.name,
-                "status": "created",
-                "n8n_id": workflow_id
-            }
+            synced_workflows.append({
+                "id": str(workflow_id),
+                "name": name,
+                "status": sync_status,
+                "n8n_id": n8n_id
+            })
+        
+        if inserts:
+            self.db.execute(insert(Workflow).values(list(inserts.values())))
+        if updates:
+            # Bulk UPDATE by primary key, executed as a single executemany
+            self.db.execute(
+                update(Workflow),
+                [{"id": workflow_id, "definition": definition} for workflow_id, definition in updates.items()]
+            )
+        
+        return synced_workflows
     
     def convert_n8n_definition(self, n8n_workflow: Dict[str, Any]) -> Dict[str, Any]:
         """Convert n8n workflow definition to our format."""
         nodes = n8n_workflow.get("nodes", [])
         connections = n8n_workflow.get("connections", {})
         
-        # Convert nodes
-        converted_nodes = []
-        for node in nodes:
-            converted_node = {
+        # Convert nodes; the type map is bound locally for the per-node lookups
+        node_types = N8N_NODE_TYPES
+        converted_nodes = [
+            {
                 "id": node.get("name", node.get("id")),
-                "type": self.map_n8n_node_type(node.get("type", "")),
+                "type": node_types.get(node.get("type", ""), "generic"),
                 "name": node.get("name", ""),
                 "parameters": node.get("parameters", {}),
                 "position": node.get("position", [0, 0])
             }
-            converted_nodes.append(converted_node)
+            for node in nodes
+        ]
         
-        # Convert connections
-        converted_connections = []
-        for source_node, targets in connections.items():
-            for output_index, target_list in targets.items():
-                for target in target_list:
-                    converted_connections.append({
-                        "source": source_node,
-                        "target": target.get("node"),
-                        "sourceOutput": output_index,
-                        "targetInput": str(target.get("type", "main"))
-                    })
+        # Convert connections, flattening source -> output -> targets in one pass
+        converted_connections = [
+            {
+                "source": source_node,
+                "target": target.get("node"),
+                "sourceOutput": output_index,
+                "targetInput": str(target.get("type", "main"))
+            }
+            for source_node, targets in connections.items()
+            for output_index, target_list in targets.items()
+            for target in target_list
+        ]
         
         return {
             "nodes": converted_nodes,
@@ -187,27 +331,17 @@ class N8nService:
             }
         }
     
-    def map_n8n_node_type(self, n8n_type: str) -> str:
+    @staticmethod
+    def map_n8n_node_type(n8n_type: str) -> str:
         """Map n8n node types to our internal types."""
-        type_mapping = {
-            "n8n-nodes-base.start": "start",
-            "n8n-nodes-base.httpRequest": "http_request",
-            "n8n-nodes-base.webhook": "webhook",
-            "n8n-nodes-base.set": "data_transform",
-            "n8n-nodes-base.if": "condition",
-            "n8n-nodes-base.function": "function",
-            "n8n-nodes-base.code": "code",
-            "n8n-nodes-base.merge": "merge",
-            "n8n-nodes-base.split": "split",
-            "n8n-nodes-base.wait": "wait",
-            "n8n-nodes-base.schedule": "schedule"
-        }
-        
-        return type_mapping.get(n8n_type, "generic")
+        return N8N_NODE_TYPES.get(n8n_type, "generic")
     
     def export_workflow_to_n8n(self, workflow_id: str, user_id: str) -> Dict[str, Any]:
         """Export local workflow to n8n format."""
-        workflow = self.db.query(Workflow).filter(
+        # Only the columns the n8n conversion and its cache key read
+        workflow = self.db.query(Workflow).options(
+            load_only(Workflow.name, Workflow.definition, Workflow.status, Workflow.updated_at)
+        ).filter(
             Workflow.id == workflow_id,
             Workflow.user_id == user_id
         ).first()
@@ -219,14 +353,15 @@ class N8nService:
             )
         
         # Convert to n8n format
-        n8n_workflow = self.convert_to_n8n_format(workflow)
+        n8n_body = self.get_n8n_export_body(workflow)
         
         try:
             # Create workflow in n8n
-            response = requests.post(
+            response = self.session.post(
                 f"{self.n8n_url}/api/v1/workflows",
                 headers=self.headers,
-                json=n8n_workflow,
+                # self.headers already sets Content-Type: application/json
+                data=n8n_body,
                 timeout=30
             )
             
@@ -236,7 +371,7 @@ class N8nService:
                     detail=f"Failed to create workflow in n8n: {response.text}"
                 )
             
-            n8n_response = response.json()
+            n8n_response = orjson.loads(response.content)
             
             return {
                 "status": "exported",
@@ -251,6 +386,92 @@ class N8nService:
                 detail=f"Export failed: {str(e)}"
             )
     
+    async def export_many(self, workflow_ids: List[str], user_id: str) -> List[Dict[str, Any]]:
+        """Export several local workflows to n8n concurrently.
+        
+        Returns one result per requested ID; a failed export is reported in its
+        result rather than failing the whole batch.
+        """
+        requested = []
+        for workflow_id in workflow_ids:
+            try:
+                requested.append(str(uuid.UUID(workflow_id)))
+            except ValueError:
+                requested.append(workflow_id)
+        
+        workflows = await run_in_threadpool(self._load_workflows_for_export, requested, user_id)
+        semaphore = asyncio.Semaphore(N8N_EXPORT_CONCURRENCY)
+        
+        async with httpx.AsyncClient(
+            headers=self.headers,
+            timeout=30,
+            limits=httpx.Limits(max_connections=20)
+        ) as client:
+            async def export_one(workflow: Workflow) -> Dict[str, Any]:
+                result = {"workflow_id": str(workflow.id)}
+                try:
+                    async with semaphore:
+                        response = await client.post(
+                            f"{self.n8n_url}/api/v1/workflows",
+                            content=self.get_n8n_export_body(workflow)
+                        )
+                    
+                    if response.status_code not in [200, 201]:
+                        return {**result, "status": "failed", "error": response.text}
+                    
+                    n8n_id = orjson.loads(response.content).get("data", {}).get("id")
+                    return {
+                        **result,
+                        "status": "exported",
+                        "n8n_id": n8n_id,
+                        "n8n_url": f"{self.n8n_url}/workflow/{n8n_id}"
+                    }
+                except Exception as e:
+                    logger.error(f"Failed to export workflow {workflow.id} to n8n: {str(e)}")
+                    return {**result, "status": "failed", "error": str(e)}
+            
+            exported = await asyncio.gather(*(export_one(workflow) for workflow in workflows))
+        
+        results = {result["workflow_id"]: result for result in exported}
+        return [
+            results.get(workflow_id, {"workflow_id": workflow_id, "status": "not_found"})
+            for workflow_id in requested
+        ]
+    
+    def _load_workflows_for_export(self, workflow_ids: List[str], user_id: str) -> List[Workflow]:
+        """Fetch the user's workflows to export in a single query."""
+        valid_ids = []
+        for workflow_id in workflow_ids:
+            try:
+                valid_ids.append(uuid.UUID(workflow_id))
+            except ValueError:
+                continue
+        
+        if not valid_ids:
+            return []
+        
+        return self.db.query(Workflow).options(
+            load_only(Workflow.id, Workflow.name, Workflow.definition, Workflow.status, Workflow.updated_at)
+        ).filter(
+            Workflow.id.in_(valid_ids),
+            Workflow.user_id == user_id
+        ).all()
+    
+    def get_n8n_export_body(self, workflow: Workflow) -> bytes:
+        """Return the encoded n8n body for a workflow, reusing it until the workflow changes."""
+        if workflow.updated_at is None:
+            return orjson.dumps(self.convert_to_n8n_format(workflow))
+        
+        cache_key = (workflow.id, workflow.updated_at)
+        with _export_body_cache_lock:
+            body = _export_body_cache.get(cache_key)
+        
+        if body is None:
+            body = orjson.dumps(self.convert_to_n8n_format(workflow))
+            with _export_body_cache_lock:
+                _export_body_cache[cache_key] = body
+        return body
+    
     def convert_to_n8n_format(self, workflow: Workflow) -> Dict[str, Any]:
         """Convert local workflow to n8n format."""
         definition = workflow.definition
@@ -293,26 +514,13 @@ class N8nService:
             "nodes": n8n_nodes,
             "connections": n8n_connections,
             "settings": definition.get("settings", {}),
-            "active": workflow.status == "ACTIVE"
+            "active": workflow.status == WorkflowStatus.ACTIVE
         }
     
-    def map_to_n8n_node_type(self, internal_type: str) -> str:
+    @staticmethod
+    def map_to_n8n_node_type(internal_type: str) -> str:
         """Map internal node types to n8n types."""
-        reverse_mapping = {
-            "start": "n8n-nodes-base.start",
-            "http_request": "n8n-nodes-base.httpRequest",
-            "webhook": "n8n-nodes-base.webhook",
-            "data_transform": "n8n-nodes-base.set",
-            "condition": "n8n-nodes-base.if",
-            "function": "n8n-nodes-base.function",
-            "code": "n8n-nodes-base.code",
-            "merge": "n8n-nodes-base.merge",
-            "split": "n8n-nodes-base.split",
-            "wait": "n8n-nodes-base.wait",
-            "schedule": "n8n-nodes-base.schedule"
-        }
-        
-        return reverse_mapping.get(internal_type, "n8n-nodes-base.function")
+        return INTERNAL_NODE_TYPES.get(internal_type, "n8n-nodes-base.function")
     
     def create_webhook_in_n8n(self, workflow_id: str, webhook_path: str) -> Dict[str, Any]:
         """Create a webhook node in n8n workflow."""
@@ -331,7 +539,7 @@ class N8nService:
             return {
                 "status": "created",
                 "webhook_node": webhook_node,
-                "webhook_url": f"{settings.WEBHOOK_BASE_URL}/webhook/{webhook_path}"
+                "webhook_url": f"{settings.webhook_base_url}/webhook/{webhook_path}"
             }
             
         except Exception as e:
@@ -344,7 +552,7 @@ class N8nService:
     def get_n8n_executions(self, workflow_id: str) -> List[Dict[str, Any]]:
         """Get execution history from n8n."""
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.n8n_url}/api/v1/executions",
                 headers=self.headers,
                 params={"workflowId": workflow_id},
@@ -352,7 +560,7 @@ class N8nService:
             )
             
             if response.status_code == 200:
-                return response.json().get("data", [])
+                return orjson.loads(response.content).get("data", [])
             else:
                 logger.warning(f"Failed to get n8n executions: {response.text}")
                 return []
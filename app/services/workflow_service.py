@@ -1,12 +1,14 @@
 """Workflow service for managing workflow operations."""
 from typing import List, Dict, Any, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
-from app.models import Workflow, Execution, ExecutionStatus, User
+from sqlalchemy.orm import Session, load_only
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_, func, lambda_stmt, select, update
+from app.models import Workflow, WorkflowStatus, Execution, ExecutionStatus, User
 from app.schemas.workflow import WorkflowCreate, WorkflowUpdate
 from datetime import datetime, timedelta
 import uuid
 import json
+import fastjsonschema
 
 
 class WorkflowService:
@@ -26,11 +28,16 @@ class WorkflowService:
                         "name": {"type": "string"},
                         "parameters": {"type": "object"},
                         "position": {
-                            "type": "object",
-                            "properties": {
-                                "x": {"type": "number"},
-                                "y": {"type": "number"}
-                            }
+                            "anyOf": [
+                                {
+                                    "type": "object",
+                                    "properties": {
+                                        "x": {"type": "number"},
+                                        "y": {"type": "number"}
+                                    }
+                                },
+                                {"type": "array", "items": {"type": "number"}}
+                            ]
                         }
                     },
                     "required": ["id", "type", "name"]
@@ -42,7 +49,7 @@ class WorkflowService:
                     "type": "object",
                     "properties": {
                         "source": {"type": "string"},
-                        "target": {"type": "string"},
+                        "target": {"type": ["string", "null"]},
                         "sourceOutput": {"type": "string"},
                         "targetInput": {"type": "string"}
                     },
@@ -66,15 +73,10 @@ class WorkflowService:
     
     def validate_workflow_definition(self, definition: Dict[str, Any]) -> bool:
         """Validate workflow definition against schema."""
-        # Basic validation - check required fields
-        if not isinstance(definition, dict):
-            raise ValueError("Workflow definition must be a dictionary")
-        
-        if "nodes" not in definition:
-            raise ValueError("Workflow definition must contain 'nodes'")
-        
-        if not isinstance(definition["nodes"], list):
-            raise ValueError("Workflow 'nodes' must be a list")
+        try:
+            _validate_workflow_schema(definition)
+        except fastjsonschema.JsonSchemaException as e:
+            raise ValueError(f"Invalid workflow definition: {e.message}")
         
         return True
     
@@ -90,16 +92,7 @@ class WorkflowService:
         self.validate_workflow_definition(definition)
         
         # Check for duplicate names for this user
-        existing = self.db.query(Workflow).filter(
-            Workflow.user_id == user_id,
-            Workflow.name == name
-        ).first()
-        
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Workflow with this name already exists"
-            )
+        self._ensure_name_available(user_id, name)
         
         # Create workflow
         workflow = Workflow(
@@ -123,10 +116,31 @@ class WorkflowService:
         **updates
     ) -> Workflow:
         """Update workflow with validation."""
-        workflow = self.db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.user_id == user_id
-        ).first()
+        # Without a definition to validate, apply the update in a single
+        # UPDATE ... RETURNING instead of loading the row first
+        if "definition" not in updates:
+            if "name" in updates:
+                self._ensure_name_available(user_id, updates["name"], exclude_id=workflow_id)
+            
+            values = {key: value for key, value in updates.items() if key in Workflow.__table__.c}
+            values["updated_at"] = datetime.utcnow()
+            workflow = self.db.scalars(
+                update(Workflow).where(
+                    Workflow.id == workflow_id,
+                    Workflow.user_id == user_id
+                ).values(**values).returning(Workflow)
+            ).first()
+            
+            if not workflow:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Workflow not found"
+                )
+            
+            self.db.commit()
+            return workflow
+        
+        workflow = self._get_user_workflow(workflow_id, user_id)
         
         if not workflow:
             raise HTTPException(
@@ -134,23 +148,12 @@ class WorkflowService:
                 detail="Workflow not found"
             )
         
-        # Validate definition if provided
-        if "definition" in updates:
-            self.validate_workflow_definition(updates["definition"])
+        # Validate definition
+        self.validate_workflow_definition(updates["definition"])
         
         # Check name uniqueness if name is being updated
         if "name" in updates and updates["name"] != workflow.name:
-            existing = self.db.query(Workflow).filter(
-                Workflow.user_id == user_id,
-                Workflow.name == updates["name"],
-                Workflow.id != workflow_id
-            ).first()
-            
-            if existing:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="Workflow with this name already exists"
-                )
+            self._ensure_name_available(user_id, updates["name"], exclude_id=workflow_id)
         
         # Apply updates
         for key, value in updates.items():
@@ -163,12 +166,36 @@ class WorkflowService:
         
         return workflow
     
-    def activate_workflow(self, workflow_id: str, user_id: str) -> Workflow:
-        """Activate a workflow for execution."""
-        workflow = self.db.query(Workflow).filter(
+    def _get_user_workflow(self, workflow_id: str, user_id: str) -> Optional[Workflow]:
+        """Load one of the user's workflows.
+        
+        Built as a lambda statement so SQLAlchemy caches the construct itself
+        and only rebinds the ids on each call.
+        """
+        stmt = lambda_stmt(lambda: select(Workflow).where(
             Workflow.id == workflow_id,
             Workflow.user_id == user_id
-        ).first()
+        ))
+        return self.db.execute(stmt).scalar_one_or_none()
+    
+    def _ensure_name_available(self, user_id: str, name: str, exclude_id: Optional[str] = None):
+        """Raise if the user already has another workflow with this name."""
+        query = self.db.query(Workflow.id).filter(
+            Workflow.user_id == user_id,
+            Workflow.name == name
+        )
+        if exclude_id is not None:
+            query = query.filter(Workflow.id != exclude_id)
+        
+        if self.db.query(query.exists()).scalar():
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Workflow with this name already exists"
+            )
+    
+    def activate_workflow(self, workflow_id: str, user_id: str) -> Workflow:
+        """Activate a workflow for execution."""
+        workflow = self._get_user_workflow(workflow_id, user_id)
         
         if not workflow:
             raise HTTPException(
@@ -182,17 +209,14 @@ class WorkflowService:
         workflow.status = WorkflowStatus.ACTIVE
         workflow.updated_at = datetime.utcnow()
         
+        # Request sessions keep attributes after commit, so no reload is needed
         self.db.commit()
-        self.db.refresh(workflow)
         
         return workflow
     
     def deactivate_workflow(self, workflow_id: str, user_id: str) -> Workflow:
         """Deactivate a workflow."""
-        workflow = self.db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.user_id == user_id
-        ).first()
+        workflow = self._get_user_workflow(workflow_id, user_id)
         
         if not workflow:
             raise HTTPException(
@@ -204,7 +228,6 @@ class WorkflowService:
         workflow.updated_at = datetime.utcnow()
         
         self.db.commit()
-        self.db.refresh(workflow)
         
         return workflow
     
@@ -213,13 +236,14 @@ class WorkflowService:
         workflow_id: str, 
         user_id: str,
         limit: int = 50,
-        offset: int = 0
+        offset: int = 0,
+        summary_only: bool = False
     ) -> List[Execution]:
-        """Get workflow execution history."""
-        workflow = self.db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.user_id == user_id
-        ).first()
+        """Get workflow execution history.
+        
+        With summary_only, the input/output payloads are not loaded.
+        """
+        workflow = self._get_user_workflow(workflow_id, user_id)
         
         if not workflow:
             raise HTTPException(
@@ -227,18 +251,52 @@ class WorkflowService:
                 detail="Workflow not found"
             )
         
-        executions = self.db.query(Execution).filter(
+        query = self.db.query(Execution).filter(
             Execution.workflow_id == workflow_id
-        ).order_by(Execution.created_at.desc()).offset(offset).limit(limit).all()
+        ).order_by(Execution.created_at.desc()).offset(offset).limit(limit)
+        
+        if summary_only:
+            query = query.options(load_only(
+                Execution.id,
+                Execution.workflow_id,
+                Execution.status,
+                Execution.started_at,
+                Execution.completed_at,
+                Execution.created_at
+            ))
+        
+        # Stream rows from a server-side cursor in batches rather than
+        # buffering the whole result set, payloads included, at once
+        return list(query.execution_options(stream_results=True).yield_per(100))
+    
+    def get_execution_output(self, execution_id: str, user_id: str) -> Dict[str, Any]:
+        """Get the stored result of one of the user's executions."""
+        row = self.db.query(
+            Execution.id,
+            Execution.status,
+            Execution.output_data,
+            Execution.error_message
+        ).join(Workflow, Execution.workflow_id == Workflow.id).filter(
+            Execution.id == execution_id,
+            Workflow.user_id == user_id
+        ).first()
         
-        return executions
+        if not row:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Execution not found"
+            )
+        
+        return {
+            "execution_id": str(row.id),
+            "status": row.status.value,
+            "output_data": row.output_data,
+            "error_message": row.error_message
+        }
     
     def can_execute_workflow(self, workflow_id: str, user_id: str) -> bool:
         """Check if workflow can be executed."""
-        workflow = self.db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.user_id == user_id
-        ).first()
+        workflow = self._get_user_workflow(workflow_id, user_id)
         
         if not workflow:
             return False
@@ -247,10 +305,7 @@ class WorkflowService:
     
     def get_workflow_statistics(self, workflow_id: str, user_id: str) -> Dict[str, Any]:
         """Get workflow execution statistics."""
-        workflow = self.db.query(Workflow).filter(
-            Workflow.id == workflow_id,
-            Workflow.user_id == user_id
-        ).first()
+        workflow = self._get_user_workflow(workflow_id, user_id)
         
         if not workflow:
             raise HTTPException(
@@ -258,25 +313,21 @@ class WorkflowService:
                 detail="Workflow not found"
             )
         
-        # Get execution counts by status
-        total_executions = self.db.query(Execution).filter(
-            Execution.workflow_id == workflow_id
-        ).count()
-        
-        successful_executions = self.db.query(Execution).filter(
-            Execution.workflow_id == workflow_id,
-            Execution.status == ExecutionStatus.COMPLETED
-        ).count()
-        
-        failed_executions = self.db.query(Execution).filter(
-            Execution.workflow_id == workflow_id,
-            Execution.status == ExecutionStatus.FAILED
-        ).count()
+        # Get execution counts by status in a single grouped query
+        counts = dict(
+            self.db.execute(
+                select(Execution.status, func.count()).select_from(Execution).where(
+                    Execution.workflow_id == workflow_id
+                ).group_by(Execution.status)
+            ).all()
+        )
         
-        running_executions = self.db.query(Execution).filter(
-            Execution.workflow_id == workflow_id,
-            Execution.status.in_([ExecutionStatus.PENDING, ExecutionStatus.RUNNING])
-        ).count()
+        total_executions = sum(counts.values())
+        successful_executions = counts.get(ExecutionStatus.COMPLETED, 0)
+        failed_executions = counts.get(ExecutionStatus.FAILED, 0)
+        running_executions = (
+            counts.get(ExecutionStatus.PENDING, 0) + counts.get(ExecutionStatus.RUNNING, 0)
+        )
         
         return {
             "total_executions": total_executions,
@@ -284,4 +335,8 @@ class WorkflowService:
             "failed_executions": failed_executions,
             "running_executions": running_executions,
             "success_rate": successful_executions / total_executions if total_executions > 0 else 0
-        }
\ No newline at end of file
+        }
+
+
+# Compile the schema once into a generated validator function
+_validate_workflow_schema = fastjsonschema.compile(WorkflowService.WORKFLOW_SCHEMA)
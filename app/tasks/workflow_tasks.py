@@ -1,15 +1,27 @@
 """
 Celery tasks for workflow execution.
 """
-import json
+import operator
+import re
+import threading
 import traceback
-from datetime import datetime
-from typing import Dict, Any, List
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import DefaultCookiePolicy
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+import requests
+from cachetools import LRUCache
 from celery import current_task
-from sqlalchemy.orm import sessionmaker
+from celery.signals import task_postrun, worker_process_init
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import joinedload, scoped_session, sessionmaker
 from app.celery_app import celery_app
 from app.core.database import engine
-from app.models import Workflow, Execution, ExecutionLog
+from app.models import Execution, ExecutionLog
 from app.models.execution import ExecutionStatus
 from app.models.execution_log import LogLevel
 import logging
@@ -19,51 +31,173 @@ logger = logging.getLogger(__name__)
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# One session per worker thread (or greenlet under gevent), reused across the
+# tasks it runs and reset after each one
+ScopedSession = scoped_session(SessionLocal)
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Drop pooled connections inherited from the parent process after fork."""
+    ScopedSession.remove()
+    engine.dispose(close=False)
+
+
+@task_postrun.connect
+def remove_task_session(**kwargs):
+    """Reset the task's session even if the task didn't exit cleanly."""
+    ScopedSession.remove()
+
+# Buffered execution logs written per batch
+LOG_FLUSH_SIZE = 100
+
+# Independent nodes of one workflow level executed at once
+NODE_EXECUTION_CONCURRENCY = 8
+
+# Execution plans (node lookup, topological levels, templated parameter names
+# per node) keyed by (workflow id, updated_at); any edit bumps updated_at, so
+# stale plans are never looked up again
+ExecutionPlan = Tuple[Dict[str, Dict[str, Any]], List[List[str]], Dict[str, FrozenSet[str]]]
+_execution_plan_cache: LRUCache = LRUCache(maxsize=256)
+_execution_plan_cache_lock = threading.Lock()
+
+# Template variables: {{variable_name}}
+_VAR_RE = re.compile(r'\{\{(\w+)\}\}')
+
+# Condition operators, checked in this order
+_CONDITION_SYMBOLS = ("==", "!=", ">=", "<=", ">", "<")
+_ORDERING_OPERATORS = {
+    ">=": operator.ge,
+    "<=": operator.le,
+    ">": operator.gt,
+    "<": operator.lt,
+}
+
+
+@lru_cache(maxsize=1024)
+def _parse_condition(condition: str) -> Tuple[Optional[str], str, str]:
+    """Split a condition template into (operator, left, right) once per unique condition.
+    
+    Parsing happens before variable substitution, so the cache keys on the
+    stored condition and substituted values can't change how it splits.
+    """
+    for symbol in _CONDITION_SYMBOLS:
+        separator = f" {symbol} "
+        if separator in condition:
+            left, right = condition.split(separator, 1)
+            return symbol, left, right
+    return None, condition, ""
+
+
+def _has_template(value: Any) -> bool:
+    """Whether a parameter value contains a {{variable}} anywhere inside it."""
+    if isinstance(value, str):
+        return "{{" in value
+    if isinstance(value, dict):
+        return any(_has_template(item) for item in value.values())
+    if isinstance(value, list):
+        return any(_has_template(item) for item in value)
+    return False
+
+
+@lru_cache(maxsize=4096)
+def _parse_json_path(path: str) -> Tuple[Tuple[str, Optional[int]], ...]:
+    """Split a dotted JSON path into (key, list index) segments once per unique path."""
+    return tuple((part, int(part) if part.isdigit() else None) for part in path.split("."))
+
+
+# Shared HTTP session for http_request nodes, so executions in a worker
+# process reuse pooled connections instead of reconnecting per request
+_http_session: Optional[requests.Session] = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session() -> requests.Session:
+    """Return the worker's shared, connection-pooling session for http_request nodes."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # Different users' workflows share the session, so never keep cookies
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                adapter = HTTPAdapter(
+                    pool_connections=50,
+                    pool_maxsize=100,
+                    max_retries=Retry(total=2, backoff_factor=0.1)
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _http_session = session
+    return _http_session
+
 
 class WorkflowExecutor:
     """Workflow execution engine."""
     
     def __init__(self, execution_id: str):
         self.execution_id = execution_id
-        self.db = SessionLocal()
+        self.db = ScopedSession()
         self.execution = None
         self.workflow = None
+        self._pending_logs: List[Dict[str, Any]] = []
+        # Node id -> parameter names containing templates, from the execution plan
+        self._templated_params: Dict[str, FrozenSet[str]] = {}
+        # Set while a level's nodes run on worker threads, which must not
+        # touch the session; buffered logs are flushed after the level
+        self._running_level = False
     
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.db.close()
+        try:
+            if self._pending_logs:
+                self.flush_logs()
+                self.db.commit()
+        except Exception as e:
+            logger.error(f"Failed to write logs for execution {self.execution_id}: {str(e)}")
+            self.db.rollback()
+        finally:
+            ScopedSession.remove()
     
     def load_execution(self):
         """Load execution and workflow from database."""
-        self.execution = self.db.query(Execution).filter(
-            Execution.id == self.execution_id
-        ).first()
+        # Load the execution and its workflow in a single, cached lambda statement
+        execution_id = self.execution_id
+        self.execution = self.db.execute(lambda_stmt(
+            lambda: select(Execution).options(
+                joinedload(Execution.workflow)
+            ).where(Execution.id == execution_id)
+        )).scalar_one_or_none()
         
         if not self.execution:
             raise ValueError(f"Execution {self.execution_id} not found")
         
-        self.workflow = self.db.query(Workflow).filter(
-            Workflow.id == self.execution.workflow_id
-        ).first()
+        self.workflow = self.execution.workflow
         
         if not self.workflow:
             raise ValueError(f"Workflow {self.execution.workflow_id} not found")
     
     def log_message(self, level: LogLevel, message: str, metadata: Dict[str, Any] = None):
         """Log execution message."""
-        log_entry = ExecutionLog(
-            execution_id=self.execution_id,
-            level=level,
-            message=message,
-            log_metadata=metadata or {}
-        )
-        self.db.add(log_entry)
-        self.db.commit()
+        # Buffered and written with the next status update or batch; the
+        # timestamp is taken now so it reflects when the message was logged
+        self._pending_logs.append({
+            "id": uuid.uuid4(),
+            "execution_id": self.execution_id,
+            "level": level,
+            "message": message,
+            "log_metadata": metadata or {},
+            "created_at": datetime.now(timezone.utc)
+        })
+        if len(self._pending_logs) >= LOG_FLUSH_SIZE and not self._running_level:
+            self.flush_logs()
+            self.db.commit()
         
-        # Also log to Python logger
-        getattr(logger, level.value)(f"Execution {self.execution_id}: {message}")
+        # Also log to Python logger right away; formatting is deferred to the
+        # logging module so filtered-out levels cost nothing
+        getattr(logger, level.value)("Execution %s: %s", self.execution_id, message)
     
     def update_execution_status(self, status: ExecutionStatus, error_message: str = None):
         """Update execution status."""
@@ -77,8 +211,16 @@ class WorkflowExecutor:
         if error_message:
             self.execution.error_message = error_message
         
+        # Buffered logs are committed together with the status change
+        self.flush_logs()
         self.db.commit()
     
+    def flush_logs(self):
+        """Write buffered log messages in one batch; the caller commits."""
+        if self._pending_logs:
+            ExecutionLog.bulk_write(self.db, self._pending_logs)
+            self._pending_logs = []
+    
     def execute_node(self, node: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
         """Execute a single workflow node."""
         node_id = node.get("id")
@@ -122,8 +264,6 @@ class WorkflowExecutor:
     
     def execute_http_request_node(self, node: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
         """Execute HTTP request node."""
-        import requests
-        
         parameters = node.get("parameters", {})
         method = parameters.get("method", "GET").upper()
         url = parameters.get("url", "")
@@ -132,10 +272,10 @@ class WorkflowExecutor:
         
         # Replace variables in URL and data
         url = self.replace_variables(url, context)
-        data = self.replace_variables(data, context)
+        data = self.render_parameter(node, "data", data, context)
         
         try:
-            response = requests.request(
+            response = get_http_session().request(
                 method=method,
                 url=url,
                 headers=headers,
@@ -189,16 +329,20 @@ class WorkflowExecutor:
         # Default implementation - just pass through data
         return context.get("data", {})
     
+    def render_parameter(self, node: Dict[str, Any], key: str, value: Any, context: Dict[str, Any]) -> Any:
+        """Replace variables in a node parameter, skipping values the plan found template-free."""
+        templated = self._templated_params.get(node.get("id"))
+        if templated is not None and key not in templated:
+            return value
+        return self.replace_variables(value, context)
+    
     def replace_variables(self, template: Any, context: Dict[str, Any]) -> Any:
         """Replace variables in template with context values."""
         if isinstance(template, str):
             # Simple variable replacement: {{variable_name}}
-            import re
-            def replace_var(match):
-                var_name = match.group(1)
-                return str(context.get(var_name, match.group(0)))
-            
-            return re.sub(r'\{\{(\w+)\}\}', replace_var, template)
+            if "{{" not in template:
+                return template
+            return _VAR_RE.sub(lambda match: str(context.get(match.group(1), match.group(0))), template)
         elif isinstance(template, dict):
             return {k: self.replace_variables(v, context) for k, v in template.items()}
         elif isinstance(template, list):
@@ -209,13 +353,12 @@ class WorkflowExecutor:
     def extract_json_path(self, data: Any, path: str) -> Dict[str, Any]:
         """Extract data from JSON path."""
         try:
-            parts = path.split(".")
             result = data
-            for part in parts:
+            for key, index in _parse_json_path(path):
                 if isinstance(result, dict):
-                    result = result.get(part)
-                elif isinstance(result, list) and part.isdigit():
-                    result = result[int(part)]
+                    result = result.get(key)
+                elif index is not None and isinstance(result, list):
+                    result = result[index]
                 else:
                     return {"error": f"Cannot access path {path}"}
             return {"result": result}
@@ -225,30 +368,24 @@ class WorkflowExecutor:
     def evaluate_condition(self, condition: str, context: Dict[str, Any]) -> bool:
         """Evaluate simple conditions."""
         # Very basic condition evaluation - extend as needed
-        condition = self.replace_variables(condition, context)
+        symbol, left, right = _parse_condition(condition)
+        left = self.replace_variables(left, context).strip()
         
-        # Simple comparisons
-        if " == " in condition:
-            left, right = condition.split(" == ", 1)
-            return left.strip() == right.strip()
-        elif " != " in condition:
-            left, right = condition.split(" != ", 1)
-            return left.strip() != right.strip()
-        elif " > " in condition:
-            left, right = condition.split(" > ", 1)
-            try:
-                return float(left.strip()) > float(right.strip())
-            except ValueError:
-                return False
-        elif " < " in condition:
-            left, right = condition.split(" < ", 1)
-            try:
-                return float(left.strip()) < float(right.strip())
-            except ValueError:
-                return False
-        else:
+        if symbol is None:
             # Default to checking if condition string is truthy
-            return bool(condition.strip())
+            return bool(left)
+        
+        right = self.replace_variables(right, context).strip()
+        
+        # Equality compares strings; ordering compares numbers
+        if symbol == "==":
+            return left == right
+        if symbol == "!=":
+            return left != right
+        try:
+            return _ORDERING_OPERATORS[symbol](float(left), float(right))
+        except ValueError:
+            return False
     
     def execute_workflow(self) -> Dict[str, Any]:
         """Execute the complete workflow."""
@@ -259,12 +396,9 @@ class WorkflowExecutor:
         self.log_message(LogLevel.INFO, "Starting workflow execution")
         
         try:
-            definition = self.workflow.definition
-            nodes = definition.get("nodes", [])
-            connections = definition.get("connections", [])
-            
             # Build execution graph
-            execution_order = self.build_execution_order(nodes, connections)
+            node_by_id, levels, self._templated_params = self.get_execution_plan()
+            total_nodes = sum(len(level) for level in levels)
             
             # Execute nodes in order
             context = {
@@ -274,19 +408,42 @@ class WorkflowExecutor:
             }
             
             output_data = {}
+            completed = 0
             
-            for node_id in execution_order:
-                node = next((n for n in nodes if n["id"] == node_id), None)
-                if node:
-                    result = self.execute_node(node, context)
-                    context["data"] = result
-                    output_data[node_id] = result
+            with ThreadPoolExecutor(max_workers=NODE_EXECUTION_CONCURRENCY) as pool:
+                for level in levels:
+                    level_nodes = [node_by_id[node_id] for node_id in level if node_id in node_by_id]
+                    if not level_nodes:
+                        continue
+                    
+                    if len(level_nodes) == 1:
+                        results = [self.execute_node(level_nodes[0], context)]
+                    else:
+                        # Nodes in a level don't depend on each other; each gets
+                        # its own copy of the context left by the previous level
+                        self._running_level = True
+                        try:
+                            futures = [
+                                pool.submit(self.execute_node, node, dict(context))
+                                for node in level_nodes
+                            ]
+                            results = [future.result() for future in futures]
+                        finally:
+                            self._running_level = False
+                        if len(self._pending_logs) >= LOG_FLUSH_SIZE:
+                            self.flush_logs()
+                            self.db.commit()
+                    
+                    for node, result in zip(level_nodes, results):
+                        output_data[node["id"]] = result
+                    context["data"] = results[-1]
+                    completed += len(level_nodes)
                     
                     # Update task progress
-                    progress = (execution_order.index(node_id) + 1) / len(execution_order) * 100
+                    progress = completed / total_nodes * 100
                     current_task.update_state(
                         state="PROGRESS",
-                        meta={"progress": progress, "current_node": node.get("name", node_id)}
+                        meta={"progress": progress, "current_node": level_nodes[-1].get("name", level_nodes[-1]["id"])}
                     )
             
             # Update execution with results
@@ -302,46 +459,74 @@ class WorkflowExecutor:
             self.log_message(LogLevel.ERROR, error_msg, {"traceback": traceback.format_exc()})
             raise
     
-    def build_execution_order(self, nodes: List[Dict[str, Any]], connections: List[Dict[str, Any]]) -> List[str]:
-        """Build execution order from workflow definition."""
-        # Simple topological sort
-        from collections import defaultdict, deque
+    def get_execution_plan(self) -> ExecutionPlan:
+        """Return the workflow's execution plan, reusing it until the workflow changes."""
+        if self.workflow.updated_at is None:
+            return self.build_execution_plan()
         
-        # Build adjacency list
-        graph = defaultdict(list)
-        in_degree = defaultdict(int)
+        cache_key = (self.workflow.id, self.workflow.updated_at)
+        with _execution_plan_cache_lock:
+            plan = _execution_plan_cache.get(cache_key)
         
-        # Initialize all nodes
-        for node in nodes:
-            node_id = node["id"]
-            in_degree[node_id] = 0
+        if plan is None:
+            plan = self.build_execution_plan()
+            with _execution_plan_cache_lock:
+                _execution_plan_cache[cache_key] = plan
+        return plan
+    
+    def build_execution_plan(self) -> ExecutionPlan:
+        """Build the node lookup, execution levels and templated parameters from the workflow definition."""
+        definition = self.workflow.definition
+        nodes = definition.get("nodes", [])
+        connections = definition.get("connections", [])
+        templated_params = {
+            n["id"]: frozenset(key for key, value in n.get("parameters", {}).items() if _has_template(value))
+            for n in nodes
+        }
+        return {n["id"]: n for n in nodes}, self.build_execution_levels(nodes, connections), templated_params
+    
+    def build_execution_order(self, nodes: List[Dict[str, Any]], connections: List[Dict[str, Any]]) -> List[str]:
+        """Build execution order from workflow definition."""
+        return [node_id for level in self.build_execution_levels(nodes, connections) for node_id in level]
+    
+    def build_execution_levels(self, nodes: List[Dict[str, Any]], connections: List[Dict[str, Any]]) -> List[List[str]]:
+        """Group nodes into topological levels whose nodes don't depend on each other."""
+        # Kahn's topological sort over dense integer node indices, one level at a time
+        node_ids = [node["id"] for node in nodes]
+        index_of = {node_id: i for i, node_id in enumerate(node_ids)}
+        graph: List[List[int]] = [[] for _ in node_ids]
+        in_degree = [0] * len(node_ids)
         
-        # Build graph from connections
+        # Build adjacency lists from connections between known nodes
         for connection in connections:
-            source = connection["source"]
-            target = connection["target"]
+            source = index_of.get(connection["source"])
+            target = index_of.get(connection["target"])
+            if source is None or target is None:
+                continue
             graph[source].append(target)
             in_degree[target] += 1
         
-        # Topological sort
-        queue = deque([node_id for node_id in in_degree if in_degree[node_id] == 0])
-        result = []
+        level = [i for i, degree in enumerate(in_degree) if degree == 0]
+        levels: List[List[int]] = []
+        visited = 0
         
-        while queue:
-            node_id = queue.popleft()
-            result.append(node_id)
-            
-            for neighbor in graph[node_id]:
-                in_degree[neighbor] -= 1
-                if in_degree[neighbor] == 0:
-                    queue.append(neighbor)
+        while level:
+            levels.append(level)
+            visited += len(level)
+            next_level = []
+            for i in level:
+                for neighbor in graph[i]:
+                    in_degree[neighbor] -= 1
+                    if in_degree[neighbor] == 0:
+                        next_level.append(neighbor)
+            level = next_level
         
-        # If result doesn't contain all nodes, there might be a cycle
-        if len(result) != len(nodes):
-            # Fallback to original order
-            result = [node["id"] for node in nodes]
+        # If levels don't contain all nodes, there might be a cycle
+        if visited != len(node_ids):
+            # Fallback to original order, one node at a time
+            return [[node_id] for node_id in node_ids]
         
-        return result
+        return [[node_ids[i] for i in level] for level in levels]
 
 
 @celery_app.task(bind=True)
@@ -349,8 +534,9 @@ def execute_workflow_task(self, execution_id: str):
     """Celery task to execute a workflow."""
     try:
         with WorkflowExecutor(execution_id) as executor:
-            result = executor.execute_workflow()
-            return {"status": "completed", "result": result}
+            executor.execute_workflow()
+            # Output is persisted on the execution; keep the broker result small
+            return {"status": "completed", "execution_id": execution_id}
     except Exception as e:
         logger.error(f"Workflow execution failed: {str(e)}")
         return {"status": "failed", "error": str(e)}
@@ -373,4 +559,16 @@ def process_webhook_task(webhook_id: str, payload: Dict[str, Any]):
         return {"status": "processed", "webhook_id": webhook_id}
     except Exception as e:
         logger.error(f"Webhook processing failed: {str(e)}")
-        return {"status": "failed", "error": str(e)}
\ No newline at end of file
+        return {"status": "failed", "error": str(e)}
+
+
+@celery_app.task
+def maintain_execution_log_partitions_task():
+    """Celery task to create upcoming execution log partitions ahead of time."""
+    try:
+        with engine.begin() as conn:
+            ExecutionLog.ensure_partitions(conn)
+        return {"status": "completed"}
+    except Exception as e:
+        logger.error(f"Execution log partition maintenance failed: {str(e)}")
+        return {"status": "failed", "error": str(e)}
@@ -0,0 +1,30 @@
+"""
+SQL statement counting for query-count regression tests.
+"""
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+from sqlalchemy import event
+
+
+@contextmanager
+def count_queries(conn, max_queries: Optional[int] = None) -> Iterator[List[str]]:
+    """Record the SQL statements executed on an engine or connection.
+    
+    Yields the list of statements; with max_queries set, raises AssertionError
+    on exit when more were issued, to guard hot paths against N+1 regressions.
+    """
+    statements: List[str] = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(conn, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(conn, "before_cursor_execute", before_cursor_execute)
+    
+    if max_queries is not None and len(statements) > max_queries:
+        raise AssertionError(
+            f"Expected at most {max_queries} queries, got {len(statements)}:\n" + "\n".join(statements)
+        )
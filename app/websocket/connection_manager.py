@@ -1,108 +1,318 @@
 """
 WebSocket connection manager for handling real-time connections.
 """
-import json
+import asyncio
 import logging
-from typing import Dict, List, Set
+import orjson
+from typing import Dict, List, Optional, Set, Tuple
 from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 from datetime import datetime
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Connections served between event loop yields during a broadcast
+BROADCAST_CHUNK_SIZE = 128
+
+# Pre-encoded welcome message; only the ISO timestamp, which never needs JSON
+# escaping, is substituted per connection
+WELCOME_MESSAGE = (
+    b'{"type":"connection","status":"connected","timestamp":"%s",'
+    b'"message":"Connected to workflow engine"}'
+)
+
 
 class ConnectionManager:
     """Manages WebSocket connections for real-time communication."""
     
+    # Fixed attribute layout; every send path reads these
+    __slots__ = (
+        "active_connections",
+        "workflow_subscriptions",
+        "execution_subscriptions",
+        "_user_workflows",
+        "_user_executions",
+        "send_queues",
+        "writer_tasks",
+        "connection_users",
+        "_broadcast_queue",
+        "_broadcast_worker",
+    )
+    
     def __init__(self):
-        # Store active connections by user ID
-        self.active_connections: Dict[str, List[WebSocket]] = {}
+        # Store active connections by user ID; sets keep membership checks
+        # and removal O(1) under reconnect churn
+        self.active_connections: Dict[str, Set[WebSocket]] = {}
         # Store connections subscribed to specific workflows
         self.workflow_subscriptions: Dict[str, Set[str]] = {}
         # Store connections subscribed to execution updates
         self.execution_subscriptions: Dict[str, Set[str]] = {}
+        # Reverse indexes so a disconnect only visits that user's subscriptions
+        self._user_workflows: Dict[str, Set[str]] = {}
+        self._user_executions: Dict[str, Set[str]] = {}
+        # Outbound message queues and their writer tasks, per connection
+        self.send_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.writer_tasks: Dict[WebSocket, asyncio.Task] = {}
+        self.connection_users: Dict[WebSocket, str] = {}
+        # Published broadcasts and the task fanning them out, started lazily
+        self._broadcast_queue: Optional[asyncio.Queue] = None
+        self._broadcast_worker: Optional[asyncio.Task] = None
     
     async def connect(self, websocket: WebSocket, user_id: str):
         """Accept a new WebSocket connection."""
         await websocket.accept()
         
         if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
+            self.active_connections[user_id] = set()
         
-        self.active_connections[user_id].append(websocket)
+        self.active_connections[user_id].add(websocket)
+        
+        queue = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.send_queues[websocket] = queue
+        self.connection_users[websocket] = user_id
+        self.writer_tasks[websocket] = asyncio.create_task(
+            self._write_batches(websocket, user_id, queue)
+        )
         logger.info(f"User {user_id} connected via WebSocket")
         
         # Send welcome message
-        await self.send_personal_message({
-            "type": "connection",
-            "status": "connected",
-            "timestamp": datetime.utcnow().isoformat(),
-            "message": "Connected to workflow engine"
-        }, websocket)
+        timestamp = datetime.utcnow().isoformat().encode()
+        await self.send_encoded_message(WELCOME_MESSAGE % timestamp, websocket)
     
     def disconnect(self, websocket: WebSocket, user_id: str):
         """Remove a WebSocket connection."""
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-                
-                # Clean up empty user connections
-                if not self.active_connections[user_id]:
-                    del self.active_connections[user_id]
+        connections = self.active_connections.get(user_id)
+        if connections is not None and websocket in connections:
+            connections.discard(websocket)
+            
+            # Clean up empty user connections
+            if not connections:
+                del self.active_connections[user_id]
+        
+        # Stop the connection's writer
+        self.send_queues.pop(websocket, None)
+        self.connection_users.pop(websocket, None)
+        writer = self.writer_tasks.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
         
         # Remove from subscriptions
         self._remove_from_subscriptions(user_id, websocket)
         logger.info(f"User {user_id} disconnected from WebSocket")
     
+    async def _write_batches(self, websocket: WebSocket, user_id: str, queue: asyncio.Queue):
+        """Drain a connection's queue, coalescing pending messages into one frame."""
+        window = settings.ws_batch_window_ms / 1000
+        try:
+            while True:
+                batch = [await queue.get()]
+                size = len(batch[0])
+                if window > 0 and queue.empty():
+                    await asyncio.sleep(window)
+                while (
+                    len(batch) < settings.ws_batch_max_messages
+                    and size < settings.ws_batch_max_bytes
+                    and not queue.empty()
+                ):
+                    message = queue.get_nowait()
+                    batch.append(message)
+                    size += len(message)
+                
+                # A client that already went away only needs cleaning up
+                if websocket.client_state != WebSocketState.CONNECTED:
+                    self.disconnect(websocket, user_id)
+                    return
+                
+                # A lone message keeps its plain object framing; several become a JSON array
+                frame = batch[0] if len(batch) == 1 else "[" + ",".join(batch) + "]"
+                await asyncio.wait_for(
+                    websocket.send_text(frame),
+                    timeout=settings.ws_send_timeout
+                )
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            logger.warning(f"Disconnecting stalled WebSocket client for user {user_id}")
+            self.disconnect(websocket, user_id)
+        except WebSocketDisconnect:
+            self.disconnect(websocket, user_id)
+        except Exception as e:
+            logger.error(f"Error sending message to user {user_id}: {e}")
+            self.disconnect(websocket, user_id)
+    
+    def _enqueue(self, data: str, websocket: WebSocket) -> bool:
+        """Queue an encoded message for a connection's writer.
+        
+        Queues hold text so one decoded payload is shared by every connection
+        it fans out to, rather than each writer decoding its own copy.
+        """
+        queue = self.send_queues.get(websocket)
+        if queue is None:
+            return False
+        
+        if queue.full():
+            if settings.ws_send_queue_full_disconnect:
+                user_id = self.connection_users.get(websocket)
+                logger.warning(f"WebSocket send queue full, disconnecting client for user {user_id}")
+                self.disconnect(websocket, user_id)
+                asyncio.create_task(self._close_quietly(websocket))
+                return True
+            # Keep the newest updates; a backed-up client mostly needs current state
+            logger.warning("WebSocket send queue full, dropping oldest message")
+            queue.get_nowait()
+        queue.put_nowait(data)
+        return True
+    
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket):
+        """Close a connection the manager has given up on, ignoring an already closed socket."""
+        try:
+            await websocket.close(code=1008)
+        except Exception:
+            pass
+    
     def _remove_from_subscriptions(self, user_id: str, websocket: WebSocket):
         """Remove websocket from all subscriptions."""
         # Remove from workflow subscriptions
-        for workflow_id in list(self.workflow_subscriptions.keys()):
-            if user_id in self.workflow_subscriptions[workflow_id]:
-                self.workflow_subscriptions[workflow_id].discard(user_id)
-                if not self.workflow_subscriptions[workflow_id]:
-                    del self.workflow_subscriptions[workflow_id]
+        for workflow_id in self._user_workflows.pop(user_id, ()):
+            self._discard_subscriber(self.workflow_subscriptions, workflow_id, user_id)
         
         # Remove from execution subscriptions
-        for execution_id in list(self.execution_subscriptions.keys()):
-            if user_id in self.execution_subscriptions[execution_id]:
-                self.execution_subscriptions[execution_id].discard(user_id)
-                if not self.execution_subscriptions[execution_id]:
-                    del self.execution_subscriptions[execution_id]
+        for execution_id in self._user_executions.pop(user_id, ()):
+            self._discard_subscriber(self.execution_subscriptions, execution_id, user_id)
+    
+    @staticmethod
+    def _discard_subscriber(subscriptions: Dict[str, Set[str]], key: str, user_id: str):
+        """Remove a user from one subscription set, dropping the set once empty."""
+        subscribers = subscriptions.get(key)
+        if subscribers is not None:
+            subscribers.discard(user_id)
+            if not subscribers:
+                del subscriptions[key]
     
     async def send_personal_message(self, message: dict, websocket: WebSocket):
         """Send a message to a specific WebSocket connection."""
+        await self.send_encoded_message(orjson.dumps(message), websocket)
+    
+    async def send_encoded_message(self, data: bytes, websocket: WebSocket):
+        """Send an already JSON-encoded message to a specific WebSocket connection."""
+        text = data.decode()
+        if self._enqueue(text, websocket):
+            return
+        
+        if websocket.client_state != WebSocketState.CONNECTED:
+            return
+        
         try:
-            await websocket.send_text(json.dumps(message))
+            await websocket.send_text(text)
         except Exception as e:
             logger.error(f"Error sending personal message: {e}")
     
+    def _send_encoded_to_user(self, data: bytes, user_id: str):
+        """Queue an already encoded message on every connection of a user."""
+        text = data.decode()
+        # Copied, since an overflowing connection may be disconnected mid-loop
+        for connection in tuple(self.active_connections.get(user_id, ())):
+            self._enqueue(text, connection)
+    
     async def send_to_user(self, message: dict, user_id: str):
         """Send a message to all connections of a specific user."""
         if user_id in self.active_connections:
-            disconnected_connections = []
-            
-            for connection in self.active_connections[user_id]:
-                try:
-                    await connection.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error sending message to user {user_id}: {e}")
-                    disconnected_connections.append(connection)
-            
-            # Remove disconnected connections
-            for connection in disconnected_connections:
-                self.active_connections[user_id].remove(connection)
+            self._send_encoded_to_user(orjson.dumps(message), user_id)
+    
+    async def broadcast_to_subscribers(self, message: dict, subscribers: Set[str]):
+        """Publish a message to subscribed users."""
+        # Encode once and share the same payload across every subscriber
+        self._publish(orjson.dumps(message).decode(), (subscribers,))
+    
+    async def broadcast_encoded_to_subscribers(self, data: bytes, subscribers: Set[str]):
+        """Publish an already encoded message to subscribed users."""
+        self._publish(data.decode(), (subscribers,))
+    
+    def _publish(self, text: str, subscriber_sets: Optional[Tuple[Set[str], ...]]):
+        """Hand a broadcast to the fan-out worker so publishers never wait on the fan-out.
+        
+        subscriber_sets are the live subscription sets, resolved to connections
+        when the broadcast is fanned out; None means every connected user.
+        """
+        if self._broadcast_worker is None or self._broadcast_worker.done():
+            self._broadcast_queue = asyncio.Queue(maxsize=settings.ws_broadcast_queue_size)
+            self._broadcast_worker = asyncio.create_task(self._run_broadcasts(self._broadcast_queue))
+        
+        try:
+            self._broadcast_queue.put_nowait((text, subscriber_sets))
+        except asyncio.QueueFull:
+            logger.warning("WebSocket broadcast queue full, dropping message")
+    
+    async def _run_broadcasts(self, queue: asyncio.Queue):
+        """Fan published broadcasts out, in order, to their subscribers' current connections."""
+        while True:
+            text, subscriber_sets = await queue.get()
+            try:
+                if subscriber_sets is None:
+                    connections = [
+                        connection
+                        for user_connections in self.active_connections.values()
+                        for connection in user_connections
+                    ]
+                else:
+                    # Users in several of the sets receive the message once
+                    user_ids = subscriber_sets[0] if len(subscriber_sets) == 1 else set().union(*subscriber_sets)
+                    connections = [
+                        connection
+                        for user_id in list(user_ids)
+                        for connection in self.active_connections.get(user_id, ())
+                    ]
+                await self._fan_out(text, connections)
+            except Exception as e:
+                logger.error(f"Error broadcasting WebSocket message: {e}")
+    
+    async def _fan_out(self, text: str, connections: List[WebSocket]):
+        """Queue a payload on many connections, yielding to the event loop between chunks.
+        
+        Connections are snapshotted synchronously, so no lock is needed: the
+        maps are only mutated on the event loop thread, and a connection that
+        disconnects between chunks has no queue left and is skipped.
+        """
+        for start in range(0, len(connections), BROADCAST_CHUNK_SIZE):
+            for connection in connections[start:start + BROADCAST_CHUNK_SIZE]:
+                self._enqueue(text, connection)
+            await asyncio.sleep(0)
     
     async def broadcast_to_workflow_subscribers(self, message: dict, workflow_id: str):
         """Send a message to all users subscribed to a workflow."""
         if workflow_id in self.workflow_subscriptions:
-            for user_id in self.workflow_subscriptions[workflow_id]:
-                await self.send_to_user(message, user_id)
+            await self.broadcast_to_subscribers(message, self.workflow_subscriptions[workflow_id])
     
     async def broadcast_to_execution_subscribers(self, message: dict, execution_id: str):
         """Send a message to all users subscribed to an execution."""
         if execution_id in self.execution_subscriptions:
-            for user_id in self.execution_subscriptions[execution_id]:
-                await self.send_to_user(message, user_id)
+            await self.broadcast_to_subscribers(message, self.execution_subscriptions[execution_id])
+    
+    async def broadcast_to_workflow_and_execution_subscribers(self, message: dict, workflow_id: str, execution_id: str):
+        """Send a message to a workflow's and an execution's subscribers, encoding it once.
+        
+        Users subscribed to both receive the message once.
+        """
+        subscriber_sets = tuple(
+            subscribers
+            for subscribers in (
+                self.workflow_subscriptions.get(workflow_id),
+                self.execution_subscriptions.get(execution_id)
+            )
+            if subscribers
+        )
+        if subscriber_sets:
+            self._publish(orjson.dumps(message).decode(), subscriber_sets)
+    
+    async def broadcast_to_all(self, message: dict):
+        """Send a message to every connected user, encoding it once."""
+        self._publish(orjson.dumps(message).decode(), None)
+    
+    def has_subscribers(self, workflow_id: Optional[str], execution_id: Optional[str] = None) -> bool:
+        """Whether anyone is subscribed to the workflow or the execution."""
+        return workflow_id in self.workflow_subscriptions or execution_id in self.execution_subscriptions
     
     def subscribe_to_workflow(self, user_id: str, workflow_id: str):
         """Subscribe a user to workflow updates."""
@@ -110,15 +320,13 @@ class ConnectionManager:
             self.workflow_subscriptions[workflow_id] = set()
         
         self.workflow_subscriptions[workflow_id].add(user_id)
+        self._user_workflows.setdefault(user_id, set()).add(workflow_id)
         logger.info(f"User {user_id} subscribed to workflow {workflow_id}")
     
     def unsubscribe_from_workflow(self, user_id: str, workflow_id: str):
         """Unsubscribe a user from workflow updates."""
-        if workflow_id in self.workflow_subscriptions:
-            self.workflow_subscriptions[workflow_id].discard(user_id)
-            
-            if not self.workflow_subscriptions[workflow_id]:
-                del self.workflow_subscriptions[workflow_id]
+        self._discard_subscriber(self.workflow_subscriptions, workflow_id, user_id)
+        self._discard_subscriber(self._user_workflows, user_id, workflow_id)
         
         logger.info(f"User {user_id} unsubscribed from workflow {workflow_id}")
     
@@ -128,15 +336,13 @@ class ConnectionManager:
             self.execution_subscriptions[execution_id] = set()
         
         self.execution_subscriptions[execution_id].add(user_id)
+        self._user_executions.setdefault(user_id, set()).add(execution_id)
         logger.info(f"User {user_id} subscribed to execution {execution_id}")
     
     def unsubscribe_from_execution(self, user_id: str, execution_id: str):
         """Unsubscribe a user from execution updates."""
-        if execution_id in self.execution_subscriptions:
-            self.execution_subscriptions[execution_id].discard(user_id)
-            
-            if not self.execution_subscriptions[execution_id]:
-                del self.execution_subscriptions[execution_id]
+        self._discard_subscriber(self.execution_subscriptions, execution_id, user_id)
+        self._discard_subscriber(self._user_executions, user_id, execution_id)
         
         logger.info(f"User {user_id} unsubscribed from execution {execution_id}")
     
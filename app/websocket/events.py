@@ -1,8 +1,8 @@
 """
 WebSocket event handlers and message types.
 """
-import json
 import logging
+import orjson
 from typing import Dict, Any
 from datetime import datetime
 from app.websocket.connection_manager import manager
@@ -16,9 +16,13 @@ class WebSocketEvents:
     @staticmethod
     async def workflow_created(workflow_data: Dict[str, Any], user_id: str):
         """Broadcast workflow creation event."""
+        # Skip building the message when nobody would receive it
+        if user_id not in manager.active_connections:
+            return
+        
         message = {
             "type": "workflow_created",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "workflow_id": workflow_data.get("id"),
                 "name": workflow_data.get("name"),
@@ -33,9 +37,12 @@ class WebSocketEvents:
     @staticmethod
     async def workflow_updated(workflow_data: Dict[str, Any], user_id: str):
         """Broadcast workflow update event."""
+        if not manager.has_subscribers(workflow_data.get("id")):
+            return
+        
         message = {
             "type": "workflow_updated",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "workflow_id": workflow_data.get("id"),
                 "name": workflow_data.get("name"),
@@ -51,9 +58,12 @@ class WebSocketEvents:
     @staticmethod
     async def workflow_deleted(workflow_id: str, user_id: str):
         """Broadcast workflow deletion event."""
+        if not manager.has_subscribers(workflow_id):
+            return
+        
         message = {
             "type": "workflow_deleted",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "workflow_id": workflow_id,
                 "deleted_by": user_id
@@ -66,9 +76,12 @@ class WebSocketEvents:
     @staticmethod
     async def execution_started(execution_data: Dict[str, Any]):
         """Broadcast execution start event."""
+        if not manager.has_subscribers(execution_data.get("workflow_id"), execution_data.get("id")):
+            return
+        
         message = {
             "type": "execution_started",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "execution_id": execution_data.get("id"),
                 "workflow_id": execution_data.get("workflow_id"),
@@ -81,16 +94,18 @@ class WebSocketEvents:
         workflow_id = execution_data.get("workflow_id")
         execution_id = execution_data.get("id")
         
-        await manager.broadcast_to_workflow_subscribers(message, workflow_id)
-        await manager.broadcast_to_execution_subscribers(message, execution_id)
+        await manager.broadcast_to_workflow_and_execution_subscribers(message, workflow_id, execution_id)
         logger.info(f"Broadcasted execution start event for execution {execution_id}")
     
     @staticmethod
     async def execution_progress(execution_id: str, workflow_id: str, progress_data: Dict[str, Any]):
         """Broadcast execution progress event."""
+        if not manager.has_subscribers(workflow_id, execution_id):
+            return
+        
         message = {
             "type": "execution_progress",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "execution_id": execution_id,
                 "workflow_id": workflow_id,
@@ -101,16 +116,18 @@ class WebSocketEvents:
             }
         }
         
-        await manager.broadcast_to_workflow_subscribers(message, workflow_id)
-        await manager.broadcast_to_execution_subscribers(message, execution_id)
+        await manager.broadcast_to_workflow_and_execution_subscribers(message, workflow_id, execution_id)
         logger.info(f"Broadcasted execution progress for execution {execution_id}")
     
     @staticmethod
     async def execution_completed(execution_data: Dict[str, Any]):
         """Broadcast execution completion event."""
+        if not manager.has_subscribers(execution_data.get("workflow_id"), execution_data.get("id")):
+            return
+        
         message = {
             "type": "execution_completed",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "execution_id": execution_data.get("id"),
                 "workflow_id": execution_data.get("workflow_id"),
@@ -125,16 +142,18 @@ class WebSocketEvents:
         workflow_id = execution_data.get("workflow_id")
         execution_id = execution_data.get("id")
         
-        await manager.broadcast_to_workflow_subscribers(message, workflow_id)
-        await manager.broadcast_to_execution_subscribers(message, execution_id)
+        await manager.broadcast_to_workflow_and_execution_subscribers(message, workflow_id, execution_id)
         logger.info(f"Broadcasted execution completion for execution {execution_id}")
     
     @staticmethod
     async def execution_failed(execution_data: Dict[str, Any], error_message: str):
         """Broadcast execution failure event."""
+        if not manager.has_subscribers(execution_data.get("workflow_id"), execution_data.get("id")):
+            return
+        
         message = {
             "type": "execution_failed",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": {
                 "execution_id": execution_data.get("id"),
                 "workflow_id": execution_data.get("workflow_id"),
@@ -148,22 +167,28 @@ class WebSocketEvents:
         workflow_id = execution_data.get("workflow_id")
         execution_id = execution_data.get("id")
         
-        await manager.broadcast_to_workflow_subscribers(message, workflow_id)
-        await manager.broadcast_to_execution_subscribers(message, execution_id)
+        await manager.broadcast_to_workflow_and_execution_subscribers(message, workflow_id, execution_id)
         logger.info(f"Broadcasted execution failure for execution {execution_id}")
     
     @staticmethod
     async def webhook_received(webhook_data: Dict[str, Any]):
         """Broadcast webhook received event."""
+        if not manager.has_subscribers(webhook_data.get("workflow_id")):
+            return
+        
+        payload_size = webhook_data.get("payload_size")
+        if payload_size is None:
+            payload_size = len(orjson.dumps(webhook_data.get("payload", {})))
+        
         message = {
             "type": "webhook_received",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": webhook_data.get("timestamp") or datetime.utcnow(),
             "data": {
                 "webhook_id": webhook_data.get("id"),
                 "workflow_id": webhook_data.get("workflow_id"),
                 "method": webhook_data.get("method"),
                 "url_path": webhook_data.get("url_path"),
-                "payload_size": len(str(webhook_data.get("payload", {})))
+                "payload_size": payload_size
             }
         }
         
@@ -176,15 +201,17 @@ class WebSocketEvents:
     @staticmethod
     async def system_status(status_data: Dict[str, Any]):
         """Broadcast system status update."""
+        if not manager.active_connections:
+            return
+        
         message = {
             "type": "system_status",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": datetime.utcnow(),
             "data": status_data
         }
         
         # Broadcast to all connected users
-        for user_id in manager.active_connections.keys():
-            await manager.send_to_user(message, user_id)
+        await manager.broadcast_to_all(message)
         
         logger.info("Broadcasted system status update")
 
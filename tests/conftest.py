@@ -0,0 +1,67 @@
+"""
+Shared pytest fixtures.
+
+Database tests run against the PostgreSQL instance named by TEST_DATABASE_URL
+and are skipped when it is not set. The schema is created inside a transaction
+that is rolled back at the end of the session, and each test runs in a
+savepoint, so nothing is left behind in the database.
+"""
+import os
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app.core.database import Base
+from app.models import User
+from app.testing.query_counter import count_queries
+
+
+@pytest.fixture(scope="session")
+def db_connection():
+    """Connection holding the test schema for the whole session."""
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    
+    engine = create_engine(url)
+    connection = engine.connect()
+    transaction = connection.begin()
+    Base.metadata.create_all(connection)
+    try:
+        yield connection
+    finally:
+        transaction.rollback()
+        connection.close()
+        engine.dispose()
+
+
+@pytest.fixture
+def db(db_connection):
+    """Session whose commits are undone after the test."""
+    savepoint = db_connection.begin_nested()
+    session = Session(
+        bind=db_connection,
+        join_transaction_mode="create_savepoint",
+        expire_on_commit=False
+    )
+    try:
+        yield session
+    finally:
+        session.close()
+        savepoint.rollback()
+
+
+@pytest.fixture
+def user(db):
+    """A persisted user owning the test's workflows."""
+    user = User(email="owner@example.com", password_hash="unused", name="Owner")
+    db.add(user)
+    db.flush()
+    return user
+
+
+@pytest.fixture
+def assert_max_queries(db_connection):
+    """Context manager factory failing the test when a block issues too many queries."""
+    def assert_max_queries(max_queries: int):
+        return count_queries(db_connection, max_queries=max_queries)
+    return assert_max_queries
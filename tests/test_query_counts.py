@@ -0,0 +1,83 @@
+"""
+Query-count regression gates for the batched n8n sync and the workflow listing projection.
+"""
+import io
+import orjson
+import pytest
+from app.api.v1.workflows import list_workflows
+from app.models import Workflow
+from app.services.n8n_service import N8nService
+
+
+class FakeN8nResponse:
+    """Streamed n8n response serving a fixed JSON body."""
+    
+    def __init__(self, body: dict):
+        self.status_code = 200
+        self.raw = io.BytesIO(orjson.dumps(body))
+        self.text = ""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+
+
+class FakeN8nSession:
+    """Stand-in for the pooled requests session, answering every GET with one body."""
+    
+    def __init__(self, body: dict):
+        self.body = body
+    
+    def get(self, url, **kwargs):
+        return FakeN8nResponse(self.body)
+
+
+def n8n_workflows(count: int) -> dict:
+    """An n8n workflow listing with count two-node workflows."""
+    return {
+        "data": [
+            {
+                "id": str(index),
+                "name": f"n8n workflow {index}",
+                "nodes": [
+                    {"name": "Start", "type": "n8n-nodes-base.start", "parameters": {}, "position": [0, 0]},
+                    {"name": "Fetch", "type": "n8n-nodes-base.httpRequest", "parameters": {"url": "https://example.com"}, "position": [200, 0]},
+                ],
+                "connections": {"Start": {"main": [{"node": "Fetch", "type": "main", "index": 0}]}},
+            }
+            for index in range(count)
+        ]
+    }
+
+
+@pytest.mark.parametrize("workflow_count", [1, 50, 400])
+def test_sync_workflows_is_O1_queries(db, user, assert_max_queries, workflow_count):
+    service = N8nService(db)
+    service.session = FakeN8nSession(n8n_workflows(workflow_count))
+    
+    # First sync inserts every workflow, the second updates them all
+    with assert_max_queries(4):
+        created = service.sync_workflows_from_n8n(user.id)
+    with assert_max_queries(4):
+        updated = service.sync_workflows_from_n8n(user.id)
+    
+    assert [item["status"] for item in created] == ["created"] * workflow_count
+    assert [item["status"] for item in updated] == ["updated"] * workflow_count
+    assert db.query(Workflow).filter(Workflow.user_id == user.id).count() == workflow_count
+
+
+def test_list_workflows_is_one_projection_query(db, user, assert_max_queries):
+    # The listing selects response columns directly, so no ORM instances or
+    # relationship loads are involved however many workflows there are
+    db.add_all([
+        Workflow(name=f"workflow {index}", definition={"nodes": []}, user_id=user.id)
+        for index in range(100)
+    ])
+    db.flush()
+    
+    with assert_max_queries(1):
+        response = list_workflows(skip=0, limit=100, db=db, current_user=user)
+    
+    assert len(orjson.loads(response.body)) == 100
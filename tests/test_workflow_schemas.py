@@ -0,0 +1,60 @@
+"""
+Workflow definition schema checks against n8n-converted definitions.
+"""
+import uuid
+from datetime import datetime, timezone
+from app.models import WorkflowStatus
+from app.schemas.workflow import WorkflowDefinition, WorkflowResponse
+from app.services.n8n_service import N8nService
+from app.services.workflow_service import WorkflowService
+
+N8N_WORKFLOW = {
+    "id": "42",
+    "name": "Fetch and notify",
+    "versionId": "7",
+    "nodes": [
+        {"name": "Start", "type": "n8n-nodes-base.start", "parameters": {}, "position": [250, 300]},
+        {"name": "Fetch", "type": "n8n-nodes-base.httpRequest", "parameters": {"url": "https://example.com"}, "position": [450, 300]},
+    ],
+    "connections": {
+        "Start": {"main": [{"node": "Fetch", "type": "main", "index": 0}]},
+        # A dangling output converts to a connection without a target
+        "Fetch": {"main": [{"type": "main", "index": 0}]},
+    },
+    "settings": {"executionOrder": "v1"},
+}
+
+
+def test_converted_n8n_definition_round_trips():
+    definition = N8nService(db=None).convert_n8n_definition(N8N_WORKFLOW)
+    
+    assert WorkflowService(db=None).validate_workflow_definition(definition)
+    assert WorkflowDefinition.model_validate(definition).model_dump(exclude_unset=True) == definition
+    
+    now = datetime.now(timezone.utc)
+    response = WorkflowResponse.model_validate({
+        "id": uuid.uuid4(),
+        "user_id": uuid.uuid4(),
+        "name": N8N_WORKFLOW["name"],
+        "definition": definition,
+        "status": WorkflowStatus.DRAFT,
+        "created_at": now,
+        "updated_at": now,
+    })
+    assert response.definition == definition
+
+
+def test_untyped_stored_definition_is_served():
+    # Definitions saved before they were validated may lack node names
+    definition = {"nodes": [{"id": "a", "type": "start"}]}
+    now = datetime.now(timezone.utc)
+    response = WorkflowResponse.model_validate({
+        "id": uuid.uuid4(),
+        "user_id": uuid.uuid4(),
+        "name": "Legacy",
+        "definition": definition,
+        "status": WorkflowStatus.ACTIVE,
+        "created_at": now,
+        "updated_at": now,
+    })
+    assert response.definition == definition